@@ -2,6 +2,8 @@ from abc import ABC, abstractmethod
 
 
 class IRenderable(ABC):
+    __slots__ = ()
+
     # @abstractmethod
     def render(self, screen, render_cfg=None, *args, **kwargs):
         pass
@@ -0,0 +1,242 @@
+import heapq
+import time
+
+import numpy as np
+
+from baseWaveFunction import BaseWaveFunction
+from sampler import Sampler
+from waveFunction import Contradiction
+
+from directions import DIRECTIONS
+from steps import CELL, OBSERVATION, PROPAGATION
+
+
+class MaskView:
+    def __init__(self, wave):
+        self.__wave = wave
+        self.__bytes = (wave.shape[2] + 7) // 8
+
+    def __getitem__(self, i):
+        y, x = divmod(i, self.__wave.shape[1])
+        return int.from_bytes(np.packbits(self.__wave[y, x], bitorder='little').tobytes(), 'little')
+
+    def __setitem__(self, i, mask):
+        y, x = divmod(i, self.__wave.shape[1])
+        mask = np.frombuffer(mask.to_bytes(self.__bytes, 'little'), dtype=np.uint8)
+        self.__wave[y, x] = np.unpackbits(mask, count=self.__wave.shape[2], bitorder='little')
+
+    def __len__(self):
+        return self.__wave.shape[0] * self.__wave.shape[1]
+
+
+# the sweep-stepping engine of the visualizer: a step narrows every cell of the changed box at once, so the
+# front is seen spreading over the grid; it is slower than WaveFunction on every tileset and cannot backtrack
+class ArrayWaveFunction(BaseWaveFunction):
+    def __init__(self, tileset, render_cfg, seed=None, metrics=None):
+        # the grid is padded by one cell on every side, a sweep narrows the padding too and never reads it back
+        width, height = render_cfg.output_size
+        self.__padded = np.ones((height + 2, width + 2, len(tileset)), dtype=bool)
+        self.__wave = self.__padded[1:-1, 1:-1]
+        self.__domains = MaskView(self.__wave)
+
+        super().__init__(tileset, render_cfg, self.__domains)
+
+        # the tiles each tile allows in all eight directions side by side, so a sweep is a single product
+        adjacency = np.asarray(tileset.index.adjacency)
+        self.__adjacency = adjacency.transpose(1, 0, 2).reshape(len(tileset), -1).astype(np.float32)
+
+        self.probabilities = np.array(tileset.weights, dtype=float) / sum(tileset.weights)
+        self.__plogp = self.probabilities * np.log2(self.probabilities)
+        self.__sampler = Sampler(self.probabilities.tolist())
+
+        self.__entropy = np.empty((height, width))
+        self.__rng = np.random.default_rng(seed)
+
+        # (entropy, cell) for every cell whose entropy was computed, stale once the entropy there changes
+        self.__heap = []
+
+        self.metrics = metrics
+
+        self.renovate()
+
+    def __update_entropy(self, y0, y1, x0, x1, changed=None):
+        wave = self.__wave[y0:y1, x0:x1]
+
+        weight_sum = wave @ self.probabilities
+        with np.errstate(divide='ignore', invalid='ignore'):
+            entropy = np.log2(weight_sum) - (wave @ self.__plogp) / weight_sum - self.__rng.uniform(0, 0.1, wave.shape[:2])
+        entropy[wave.sum(axis=2) <= 1] = np.inf
+
+        # cells of the box that did not change keep their entropy, and so their heap entries stay valid
+        if changed is None:
+            changed = np.ones(entropy.shape, dtype=bool)
+        self.__entropy[y0:y1, x0:x1][changed] = entropy[changed]
+
+        ys, xs = np.nonzero(changed & (entropy != np.inf))
+        cells = (y0 + ys) * self.size[0] + x0 + xs
+        for key, i in zip(entropy[ys, xs].tolist(), cells.tolist()):
+            heapq.heappush(self.__heap, (key, i))
+
+    def __mark_dirty(self, y0, y1, x0, x1):
+        if self.__dirty is not None:
+            y0, y1 = min(y0, self.__dirty[0]), max(y1, self.__dirty[1])
+            x0, x1 = min(x0, self.__dirty[2]), max(x1, self.__dirty[3])
+
+        self.__dirty = y0, y1, x0, x1
+
+    def __sweep(self):
+        width, height = self.size
+        tiles_count = len(self._tileset)
+        y0, y1, x0, x1 = self.__dirty
+
+        # every direction is narrowed by the dirty box as it was before the sweep
+        box = self.__wave[y0:y1, x0:x1].astype(np.float32)
+        allowed = (box.reshape(-1, tiles_count) @ self.__adjacency > 0).reshape(y1 - y0, x1 - x0, len(DIRECTIONS), tiles_count)
+
+        # only the dirty box and the ring of cells around it can change during a sweep
+        ey0, ey1, ex0, ex1 = max(y0 - 1, 0), min(y1 + 1, height), max(x0 - 1, 0), min(x1 + 1, width)
+        ring = self.__wave[ey0:ey1, ex0:ex1]
+        before = ring.sum(axis=2)
+
+        for d, (dx, dy) in enumerate(DIRECTIONS):
+            self.__padded[y0 + 1 + dy:y1 + 1 + dy, x0 + 1 + dx:x1 + 1 + dx] &= allowed[:, :, d]
+
+        after = ring.sum(axis=2)
+
+        changed = before != after
+        ys, xs = np.nonzero(changed)
+        if self._changed is not None:
+            self._changed.update(((ey0 + ys) * width + ex0 + xs).tolist())
+
+        if self.metrics is not None:
+            self.metrics.count('propagations')
+            self.metrics.count('removals', int(before.sum() - after.sum()))
+
+        if not after.all():
+            self.__contradictions += 1
+            if self.metrics is not None:
+                self.metrics.count('contradictions')
+
+            raise Contradiction('a cell has no tile left')
+
+        if len(ys) == 0:
+            self.__dirty = None
+            return
+
+        self.__dirty = ey0 + ys.min(), ey0 + ys.max() + 1, ex0 + xs.min(), ex0 + xs.max() + 1
+        self.__update_entropy(*self.__dirty, changed[ys.min():ys.max() + 1, xs.min():xs.max() + 1])
+
+    def __min_entropy_pos(self):
+        while len(self.__heap) != 0:
+            key, i = heapq.heappop(self.__heap)
+
+            # entries are never updated in place, a cell whose entropy was recomputed since the push is stale
+            if self.__entropy.flat[i] == key:
+                return i % self.size[0], i // self.size[0]
+
+    def __observe(self):
+        metrics = self.metrics
+        if metrics is not None:
+            start = time.perf_counter()
+
+        pos = self.__min_entropy_pos()
+
+        if metrics is not None:
+            metrics.record('min_entropy', time.perf_counter() - start)
+
+        if pos is None:
+            return
+
+        x, y = pos
+
+        idx = self.__sampler.sample(self.__domains[y * self.size[0] + x], self.__rng)
+
+        self.__wave[y, x] = False
+        self.__wave[y, x, idx] = True
+
+        self.add_to_stack((x, y))
+
+        if metrics is not None:
+            metrics.count('observations')
+            metrics.record('observe', time.perf_counter() - start)
+
+        return x, y
+
+    def __propagate(self):
+        # a sweep is the smallest step here, it updates every cell of the dirty box at once
+        while self.__dirty is not None:
+            self.__sweep()
+            yield CELL
+
+        yield PROPAGATION
+
+    def _resolve(self):
+        if self.metrics is not None:
+            return self.metrics.timed('propagate', self.__propagate())
+
+        return self.__propagate()
+
+    def _collapse(self):
+        while True:
+            yield from self._resolve()
+
+            if self.__observe() is None:
+                return
+
+            yield OBSERVATION
+
+    def is_collapsed(self):
+        return bool((self.__wave.sum(axis=2) <= 1).all())
+
+    def entropy_at(self, pos):
+        col, row = pos
+        tiles = self.__wave[row, col]
+        if tiles.sum() <= 1:
+            return 0
+
+        weights = self.probabilities[tiles]
+        return float(np.log2(weights.sum()) - (weights * np.log2(weights)).sum() / weights.sum())
+
+    def add_to_stack(self, pos):
+        x, y = pos
+
+        self.__update_entropy(y, y + 1, x, x + 1)
+        self.__mark_dirty(y, y + 1, x, x + 1)
+        if self._changed is not None:
+            self._changed.add(y * self.size[0] + x)
+
+    def observe(self):
+        return self.__observe()
+
+    def indices(self):
+        indices = self.__wave.argmax(axis=2)
+        indices[self.__wave.sum(axis=2) != 1] = -1
+
+        return indices.tolist()
+
+    def renovate(self, seed=None):
+        if seed is not None:
+            self.__rng = np.random.default_rng(seed)
+
+        self._collapse_gen = None
+        self.__contradictions = 0
+
+        self.__padded[...] = True
+        self.__dirty = None
+        self._changed = None
+        self.__heap = []
+
+        height, width = self.__entropy.shape
+        self.__update_entropy(0, height, 0, width)
+
+    @property
+    def sampler(self):
+        return self.__sampler
+
+    @property
+    def contradictions(self):
+        return self.__contradictions
+
+    @property
+    def backtracks(self):
+        return 0
@@ -0,0 +1,97 @@
+from abc import abstractmethod
+
+from block import Block
+
+from IRenderable import IRenderable
+
+from steps import REMOVAL, STOPS
+
+
+class BaseWaveFunction(IRenderable):
+    def __init__(self, tileset, render_cfg, domains):
+        self.size = render_cfg.output_size
+        self.index = tileset.index
+
+        self._tileset = tileset
+        self._render_cfg = render_cfg
+
+        # one mask per cell, kept up to date in place by the engine so the blocks always show the current state
+        self._domains = domains
+
+        # blocks are only views for rendering and clicks, headless solves never build them
+        self.__coeffs = None
+
+        # cells whose domain changed since the renderer last asked
+        self._changed = None
+
+        self._collapse_gen = None
+
+    @abstractmethod
+    def _resolve(self):
+        pass
+
+    @abstractmethod
+    def _collapse(self):
+        pass
+
+    @abstractmethod
+    def indices(self):
+        pass
+
+    def block_at_pos(self, pos):
+        col, row = pos
+        return self.coeffs[row][col]
+
+    def mask_at_pos(self, pos):
+        col, row = pos
+        return self._domains[row * self.size[0] + col]
+
+    def pop_changed(self):
+        # nothing is tracked until the first call, a headless solve never pays for it
+        changed, self._changed = self._changed, set()
+        if changed is None:
+            changed = range(self.size[0] * self.size[1])
+
+        return [(i % self.size[0], i // self.size[0]) for i in changed]
+
+    def propagate(self):
+        self._collapse_gen = self._resolve()
+
+    def collapse(self):
+        self._collapse_gen = self._collapse()
+
+    def update(self):
+        return next(self._collapse_gen)
+
+    def step(self, granularity=REMOVAL):
+        stops = STOPS[granularity]
+        while True:
+            event = next(self._collapse_gen)
+            if event in stops:
+                return event
+
+    def solve(self):
+        for _ in self._collapse():
+            pass
+
+    def render(self, screen, render_cfg=None, *args, **kwargs):
+        for row in self.coeffs:
+            for block in row:
+                block.render(screen, render_cfg)
+
+    def image(self, tile_size):
+        return self._tileset.image(self.indices(), tile_size)
+
+    @property
+    def coeffs(self):
+        if self.__coeffs is None:
+            render_cfg = self._render_cfg
+
+            self.__coeffs = []
+            for i in range(self.size[1]):
+                self.__coeffs.append([])
+                for j in range(self.size[0]):
+                    block = Block(self._tileset, self._domains, i * self.size[0] + j, render_cfg)
+                    self.__coeffs[i].append(block)
+
+        return self.__coeffs
@@ -0,0 +1,40 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from waveFunction import WaveFunction, Contradiction
+
+
+WAVE_FUNCTION = None
+
+
+def init_worker(engine, tileset, render_cfg, kwargs):
+    global WAVE_FUNCTION
+
+    WAVE_FUNCTION = engine(tileset, render_cfg, **kwargs)
+
+
+def solve(seed):
+    WAVE_FUNCTION.renovate(seed)
+
+    start = time.perf_counter()
+    try:
+        WAVE_FUNCTION.solve()
+        indices = np.array(WAVE_FUNCTION.indices(), dtype=np.int16)
+    except Contradiction:
+        indices = None
+    elapsed = time.perf_counter() - start
+
+    return seed, indices, elapsed, WAVE_FUNCTION.contradictions, WAVE_FUNCTION.backtracks
+
+
+def generate_batch(tileset, render_cfg, seeds, workers=None, engine=WaveFunction, **kwargs):
+    # workers only receive the rules, each builds one wave function and reuses it for all of its seeds
+    initargs = engine, tileset.headless(), render_cfg, kwargs
+
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=initargs) as executor:
+        futures = [executor.submit(solve, seed) for seed in seeds]
+
+        for future in as_completed(futures):
+            yield future.result()
@@ -0,0 +1,240 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import numpy as np
+
+from directions import DIRECTIONS
+from index import Index
+from metrics import Metrics
+from tile import Tile
+from tileset import Tileset
+from tilesheet import Tilesheet
+from renderConfig import RenderConfig
+from tilesheetConfig import TilesheetConfig
+from waveFunction import WaveFunction, Contradiction
+from arrayWaveFunction import ArrayWaveFunction
+from generate import parse_size
+
+
+def load_tileset(tileset_name):
+    tilesheet_cfg = TilesheetConfig(tileset_name)
+    tilesheet = Tilesheet(tilesheet_cfg)
+    tiles = Tile.from_images(tilesheet.tile_images)
+
+    start = time.perf_counter()
+    index = Index(tiles, variants=tilesheet.variants)
+    rules = time.perf_counter() - start
+
+    return tilesheet_cfg, Tileset(tiles, index, tilesheet.weights), rules
+
+
+def drain(wave_function):
+    wave_function.propagate()
+
+    try:
+        while True:
+            wave_function.update()
+    except StopIteration:
+        pass
+
+
+def run_seed(wave_function, seed):
+    wave_function.renovate(seed)
+
+    if wave_function.metrics is not None:
+        wave_function.metrics.reset()
+
+    propagation = observation = 0
+    solved = True
+    try:
+        while True:
+            start = time.perf_counter()
+            drain(wave_function)
+            propagation += time.perf_counter() - start
+
+            start = time.perf_counter()
+            pos = wave_function.observe()
+            observation += time.perf_counter() - start
+
+            if pos is None:
+                break
+    except Contradiction:
+        solved = False
+
+    result = {
+        'seed': seed,
+        'propagate': propagation,
+        'observe': observation,
+        'total': propagation + observation,
+        'contradictions': wave_function.contradictions,
+        'backtracks': wave_function.backtracks,
+        'solved': solved
+    }
+
+    if wave_function.metrics is not None:
+        result['metrics'] = wave_function.metrics.snapshot()
+
+    return result
+
+
+def run(tileset_names, sizes, seeds, engine=WaveFunction, metrics=False, **kwargs):
+    results = []
+    for tileset_name in tileset_names:
+        tilesheet_cfg, tileset, rules = load_tileset(tileset_name)
+
+        for size in sizes:
+            render_cfg = RenderConfig(tilesheet_cfg, len(tileset), size)
+            wave_function = engine(tileset, render_cfg, metrics=Metrics() if metrics else None, **kwargs)
+
+            runs = [run_seed(wave_function, seed) for seed in seeds]
+
+            result = {
+                'tileset': tileset_name,
+                'tiles': len(tileset),
+                'width': size[0],
+                'height': size[1],
+                'rules': rules,
+                'runs': runs
+            }
+            for key in ('propagate', 'observe', 'total'):
+                result[key] = statistics.median(run[key] for run in runs)
+
+            results.append(result)
+            print(f"{tileset_name} {size[0]}x{size[1]}: rules {rules:.3f}s; propagate {result['propagate']:.3f}s; observe {result['observe']:.3f}s; total {result['total']:.3f}s")
+
+    return results
+
+
+def compare(old, new, threshold, min_delta=0.005):
+    def key(result):
+        return result['tileset'], result['width'], result['height']
+
+    baseline = {key(result): result for result in old['results']}
+
+    regressions = []
+    for result in new['results']:
+        before = baseline.get(key(result))
+        if before is None:
+            continue
+
+        for metric in ('rules', 'propagate', 'observe', 'total'):
+            ratio = result[metric] / before[metric] if before[metric] > 0 else 1
+
+            # a few milliseconds either way is timer noise on short phases, whatever the ratio
+            flag = ''
+            if ratio > 1 + threshold and result[metric] - before[metric] > min_delta:
+                flag = '  REGRESSION'
+                regressions.append((key(result), metric, ratio))
+
+            print(f'{result["tileset"]} {result["width"]}x{result["height"]} {metric}: {before[metric]:.4f}s -> {result[metric]:.4f}s ({ratio:.2f}x){flag}')
+
+    return regressions
+
+
+def random_tileset(rng, tiles_count, density):
+    # rules are drawn for four directions and mirrored into the opposite ones, as scanned rules are
+    adjacency = np.zeros((len(DIRECTIONS), tiles_count, tiles_count), dtype=bool)
+    for d, (dx, dy) in enumerate(DIRECTIONS):
+        opposite = DIRECTIONS.index((-dx, -dy))
+        if d < opposite:
+            adjacency[d] = rng.random((tiles_count, tiles_count)) < density
+            adjacency[opposite] = adjacency[d].T
+
+    return Tileset(None, Index.from_adjacency(adjacency))
+
+
+def verify(trials, sizes, seed=0):
+    rng = np.random.default_rng(seed)
+
+    failures = 0
+    for trial in range(trials):
+        tileset = random_tileset(rng, int(rng.integers(2, 9)), rng.uniform(0.2, 0.9))
+        size = sizes[trial % len(sizes)]
+        render_cfg = RenderConfig(None, len(tileset), size)
+
+        for use_supports in (False, True):
+            wave_function = WaveFunction(tileset, render_cfg, use_supports=use_supports, seed=trial)
+            try:
+                wave_function.solve()
+            except Contradiction:
+                continue
+
+            # a solved output has to hold up against the rules themselves, not against what the propagator kept
+            violations = tileset.index.violations(wave_function.indices())
+            if len(violations) != 0:
+                failures += 1
+                print(f'trial {trial}: {len(tileset)} tiles; {size[0]}x{size[1]}; use_supports={use_supports}; {len(violations)} violations')
+
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time headless WFC solves and compare the results')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='benchmark tilesets and write the timings as JSON')
+    run_parser.add_argument('--tilesets', nargs='+', help='tileset names from metadata.json, all of them by default')
+    run_parser.add_argument('--sizes', nargs='+', type=parse_size, default=[(5, 5), (10, 10), (15, 15), (20, 20)], help='output sizes as WIDTHxHEIGHT')
+    run_parser.add_argument('--seeds', type=int, default=3, help='number of seeds per tileset and size')
+    run_parser.add_argument('--out', default='benchmark.json')
+    run_parser.add_argument('--array', action='store_true', help='time the sweep-stepping engine of the visualizer instead, it is slower than the default and does not backtrack')
+    run_parser.add_argument('--metrics', action='store_true', help='also record solver counters for every seed, at some cost to the timings')
+
+    compare_parser = commands.add_parser('compare', help='compare two result files and flag regressions')
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=0.1, help='relative slowdown reported as a regression')
+    compare_parser.add_argument('--min-delta', type=float, default=0.005, help='seconds a slowdown has to exceed as well to be reported')
+
+    verify_parser = commands.add_parser('verify', help='solve random rule sets with both propagators and check the outputs against the rules')
+    verify_parser.add_argument('--trials', type=int, default=300)
+    verify_parser.add_argument('--sizes', nargs='+', type=parse_size, default=[(4, 4), (1, 6), (6, 1), (7, 5)], help='output sizes as WIDTHxHEIGHT')
+    verify_parser.add_argument('--seed', type=int, default=0)
+
+    args = parser.parse_args()
+
+    if args.command == 'verify':
+        failures = verify(args.trials, args.sizes, args.seed)
+
+        print(f'{failures} invalid outputs')
+        sys.exit(1 if failures != 0 else 0)
+
+    if args.command == 'compare':
+        with open(args.old) as old_file, open(args.new) as new_file:
+            regressions = compare(json.load(old_file), json.load(new_file), args.threshold, args.min_delta)
+
+        print(f'{len(regressions)} regressions')
+        sys.exit(1 if len(regressions) != 0 else 0)
+
+    tileset_names = args.tilesets
+    if tileset_names is None:
+        with open('smth/WFCvisualizer/metadata.json') as json_file:
+            tileset_names = list(json.load(json_file))
+
+    if args.array:
+        engine, kwargs = ArrayWaveFunction, {}
+    else:
+        engine, kwargs = WaveFunction, {}
+
+    results = run(tileset_names, args.sizes, range(args.seeds), engine, args.metrics, **kwargs)
+
+    with open(args.out, 'w') as file:
+        json.dump({
+            'engine': engine.__name__,
+            'options': kwargs,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'results': results
+        }, file, indent=4)
+
+
+if __name__ == '__main__':
+    main()
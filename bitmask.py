@@ -0,0 +1,17 @@
+def full_mask(count):
+    return (1 << count) - 1
+
+
+def bit(idx):
+    return 1 << idx
+
+
+def bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def bit_count(mask):
+    return mask.bit_count()
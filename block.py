@@ -1,77 +1,105 @@
-import random
+import pygame
 
 from tile import Tile
 
 from IRenderable import IRenderable
 
+from bitmask import bit, bits, bit_count
+
 
 class Block(IRenderable):
-    def __init__(self, tileset, x, y, render_cfg):
-        self.__tiles = tileset
-        
-        self.__x = x + render_cfg.side_pad
-        self.__y = y + render_cfg.top_pad
-    
-    def set_random_tile(self, probabilities):
-        self.tiles = random.choices(self.__tiles, [probabilities[tile.idx] for tile in self.__tiles])
+    __slots__ = ('__tileset', '__domains', '__i', '__render_cfg')
+
+    def __init__(self, tileset, domains, i, render_cfg):
+        self.__tileset = tileset
+        self.__domains = domains
+        self.__i = i
+
+        # the position is derived from the cell index, a block stores nothing per cell but the index
+        self.__render_cfg = render_cfg
+
+    @property
+    def mask(self):
+        return self.__domains[self.__i]
+
+    @mask.setter
+    def mask(self, val):
+        self.__domains[self.__i] = val
 
     @property
     def tiles(self):
-        return self.__tiles
-    
+        return [self.__tileset[idx] for idx in bits(self.mask)]
+
     @tiles.setter
     def tiles(self, val):
         if isinstance(val, Tile):
-            self.__tiles = [val]
+            self.mask = bit(val.idx)
         elif isinstance(val, list):
-            self.__tiles = val
-    
+            mask = 0
+            for tile in val:
+                mask |= bit(tile.idx)
+            self.mask = mask
+
     @property
     def x(self):
-        return self.__x
-    
+        render_cfg = self.__render_cfg
+        return self.__i % render_cfg.output_size[0] * (render_cfg.block_width + render_cfg.block_gap) + render_cfg.side_pad
+
     @property
     def y(self):
-        return self.__y
+        render_cfg = self.__render_cfg
+        return self.__i // render_cfg.output_size[0] * (render_cfg.block_height + render_cfg.block_gap) + render_cfg.top_pad
+
+    @property
+    def rect(self):
+        return pygame.Rect(self.x, self.y, self.__render_cfg.block_width, self.__render_cfg.block_height)
 
     def render(self, screen, render_cfg=None, *args, **kwargs):
-        if len(self.__tiles) == 1:
-            for tile in self.__tiles:
-                x = self.__x
-                y = self.__y
+        mask = self.mask
+        block_x, block_y = self.x, self.y
+
+        surfaces = self.__tileset.surfaces
+        surfaces.use(render_cfg)
+
+        if bit_count(mask) == 1:
+            for tile in self.tiles:
+                x = block_x
+                y = block_y
                 size = render_cfg.block_width, render_cfg.block_height
-                tile.render(screen, x, y, size, is_single=True)
+                tile.render(screen, x, y, size, is_single=True, surfaces=surfaces)
 
         else:
-            for tile in self.__tiles:
-                x = self.__x + tile.idx %  render_cfg.tiles_count_in_row * (render_cfg.tile_width + render_cfg.tile_gap)
-                y = self.__y + tile.idx // render_cfg.tiles_count_in_row * (render_cfg.tile_height + render_cfg.tile_gap)
-                size = render_cfg.tile_width, render_cfg.tile_height
+            screen.blit(surfaces.thumbnail(mask), (block_x, block_y))
+
+            # only the tile under the mouse is shaded, on top of the shared thumbnail
+            mouse_x, mouse_y = pygame.mouse.get_pos()
+            if self.rect.collidepoint(mouse_x, mouse_y):
+                col, x = divmod(mouse_x - block_x, render_cfg.tile_width + render_cfg.tile_gap)
+                row, y = divmod(mouse_y - block_y, render_cfg.tile_height + render_cfg.tile_gap)
+
+                idx = row * render_cfg.tiles_count_in_row + col
+                if x < render_cfg.tile_width and y < render_cfg.tile_height and col < render_cfg.tiles_count_in_row and idx in self:
+                    size = render_cfg.tile_width, render_cfg.tile_height
+                    screen.blit(surfaces.shade(size), (block_x + col * (render_cfg.tile_width + render_cfg.tile_gap), block_y + row * (render_cfg.tile_height + render_cfg.tile_gap)))
 
-                tile.render(screen, x, y, size, render_cfg=render_cfg, is_single=False)
-    
     def __getitem__(self, key):
-        for tile in self.__tiles:
-            if tile.idx == key:
-                return tile
-    
-    def __setitem__(self, key, val):
-        self.__tiles[key] = val
-    
+        if key in self:
+            return self.__tileset[key]
+
     def __len__(self):
-        return len(self.__tiles)
-    
+        return bit_count(self.mask)
+
     def __contains__(self, key):
         if isinstance(key, Tile):
-            return key in self.__tiles
+            return self.mask & bit(key.idx) != 0
         elif isinstance(key, int):
-            return key in map(lambda tile: tile.idx, self.__tiles)
-    
+            return self.mask & bit(key) != 0
+
     def __eq__(self, other):
-        return self.__tiles == other.tiles
-    
+        return self.mask == other.mask
+
     def __iter__(self):
-        return iter(self.__tiles)
+        return iter(self.tiles)
 
     def __repr__(self):
-        return str(self.__tiles)
+        return str(self.tiles)
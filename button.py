@@ -22,6 +22,10 @@ class Button(IRenderable, IClickable):
         self.__top_rect = pygame.Rect(pos, (render_cfg.button_width, render_cfg.button_height))
         self.__top_color = DARK_BLUE
 
+        # the area covered by the button both raised and pressed
+        self.__rect = pygame.Rect((pos[0], pos[1] - elevation), (render_cfg.button_width, render_cfg.button_height + elevation))
+
+        self.__text = text
         self.__text_surf = FONT.render(text, True, WHITE)
         self.__text_rect = self.__text_surf.get_rect(center=self.__top_rect.center)
 
@@ -44,6 +48,20 @@ class Button(IRenderable, IClickable):
             self.__top_color = DARK_BLUE
             self.__dynamic_elevation = self.__elevation
 
+    @property
+    def rect(self):
+        return self.__rect
+
+    @property
+    def text(self):
+        return self.__text
+
+    @text.setter
+    def text(self, val):
+        self.__text = val
+        self.__text_surf = FONT.render(val, True, WHITE)
+        self.__text_rect = self.__text_surf.get_rect(center=self.__top_rect.center)
+
     def render(self, screen, render_cfg=None, *args, **kwargs):
         self.__top_rect.y = self.__y - self.__dynamic_elevation
         self.__text_rect.center = self.__top_rect.center
@@ -0,0 +1,107 @@
+import argparse
+import os
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+from waveFunction import WaveFunction, Contradiction
+from batch import generate_batch
+from ruleCache import load_tileset
+from sampler import weights_from_example
+from renderConfig import RenderConfig
+
+
+def parse_size(text):
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def save_indices(indices, filename):
+    with open(filename, 'w') as file:
+        for row in indices:
+            file.write(' '.join(map(str, row)) + '\n')
+
+
+def load_indices(filename):
+    with open(filename) as file:
+        return [list(map(int, line.split())) for line in file if line.strip()]
+
+
+def solve_all(tileset, render_cfg, seeds, engine=WaveFunction, **kwargs):
+    wave_function = engine(tileset, render_cfg, **kwargs)
+
+    for seed in seeds:
+        wave_function.renovate(seed)
+
+        start = time.perf_counter()
+        try:
+            wave_function.solve()
+            indices = wave_function.indices()
+        except Contradiction:
+            indices = None
+        elapsed = time.perf_counter() - start
+
+        yield seed, indices, elapsed, wave_function.contradictions, wave_function.backtracks
+
+
+def generate(tileset_name, output_size, seeds, output_dir, workers=1, example=None, **kwargs):
+    tilesheet_cfg, tileset = load_tileset(tileset_name)
+
+    if example is not None:
+        tileset.weights = weights_from_example(load_indices(example), len(tileset))
+    render_cfg = RenderConfig(tilesheet_cfg, len(tileset), output_size)
+
+    cells = output_size[0] * output_size[1]
+    tile_size = tilesheet_cfg.tile_width, tilesheet_cfg.tile_height
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    if workers > 1:
+        runs = generate_batch(tileset, render_cfg, seeds, workers, **kwargs)
+    else:
+        runs = solve_all(tileset, render_cfg, seeds, **kwargs)
+
+    results = []
+    for seed, indices, elapsed, contradictions, backtracks in runs:
+        if indices is not None:
+            filename = os.path.join(output_dir, f'{tileset_name}_{seed}')
+            pygame.image.save(tileset.image(indices, tile_size), f'{filename}.png')
+            save_indices(indices, f'{filename}.txt')
+
+        results.append((seed, elapsed, contradictions))
+        status = '' if indices is not None else '; failed'
+        print(f'seed {seed}: {elapsed:.3f}s; {cells / elapsed:.0f} cells/s; {contradictions} contradictions; {backtracks} backtracks{status}')
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate WFC outputs without opening a window')
+    parser.add_argument('tileset', help='tileset name from metadata.json')
+    parser.add_argument('--size', type=parse_size, default=(20, 20), help='output size as WIDTHxHEIGHT')
+    parser.add_argument('--seeds', type=int, default=1, help='number of seeds to generate')
+    parser.add_argument('--first-seed', type=int, default=0)
+    parser.add_argument('--out', default='output', help='directory for the PNGs and index maps')
+    parser.add_argument('--backtracks', type=int, default=1000, help='backtrack budget per run')
+    parser.add_argument('--workers', type=int, default=1, help='solve seeds in this many processes')
+    parser.add_argument('--weights-from', metavar='FILE', help='learn tile weights from an index map saved by an earlier run')
+    args = parser.parse_args()
+
+    seeds = range(args.first_seed, args.first_seed + args.seeds)
+
+    kwargs = {'engine': WaveFunction, 'max_backtracks': args.backtracks}
+
+    start = time.perf_counter()
+    results = generate(args.tileset, args.size, seeds, args.out, args.workers, args.weights_from, **kwargs)
+    wall = time.perf_counter() - start
+
+    total = sum(elapsed for _, elapsed, _ in results)
+    cells = args.size[0] * args.size[1] * len(results)
+    contradictions = sum(count for _, _, count in results)
+    print(f'{len(results)} runs: {total:.3f}s solving; {wall:.3f}s wall; {cells / wall:.0f} cells/s; {contradictions} contradictions')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,26 @@
+import json
+import sys
+
 import matplotlib.pyplot as plt
 import numpy as np
 
 
-x = np.array([21, 5, 40])
-y = np.array([25, 100, 225, 400])
+filename = sys.argv[1] if len(sys.argv) > 1 else 'benchmark.json'
+with open(filename) as json_file:
+    results = json.load(json_file)['results']
+
+x = np.array(sorted({result['tiles'] for result in results}))
+y = np.array(sorted({result['width'] * result['height'] for result in results}))
 
 X, Y = np.meshgrid(x, y)
 
-Z = np.array([
-    [ 1.009, 11.753, 52.799, 151.634 ],
-    [ 0.472,  2.407,  6.126,  13.463 ],
-    [ 5.077, 40.307, 173.05, 515.473 ]
-]).T
+# tilesets with the same number of tiles are averaged into one point
+Z = np.full(X.shape, np.nan)
+for i, cells in enumerate(y):
+    for j, tiles in enumerate(x):
+        times = [result['total'] for result in results if result['tiles'] == tiles and result['width'] * result['height'] == cells]
+        if len(times) != 0:
+            Z[i][j] = np.mean(times)
 
 
 print(X)
@@ -28,4 +37,3 @@ ax.set_ylabel('output size')
 ax.set_zlabel('seconds')
 
 plt.show()
-
@@ -1,33 +1,177 @@
+from collections import OrderedDict
+
+import numpy as np
+
 from directions import DIRECTIONS
+from tile import image_pixels, scale_indices
+
+from bitmask import bit, bits
+
+
+TOP, BOTTOM, LEFT_SIDE, RIGHT_SIDE = range(4)
+
+MAX_ALLOWED = 16384
+PACKED_TILES = 64
+
+
+def edge_signatures(tileset):
+    pixels = np.stack([tile.pixelset for tile in tileset])
+
+    # top and bottom rows left to right, left and right columns top to bottom, each as (T, side, channels)
+    return np.stack([pixels[:, 0], pixels[:, -1], pixels[:, :, 0], pixels[:, :, -1]], axis=1)
+
+
+def transform_pixels(pixels, turns=0, mirrored=False):
+    # quarter turns counterclockwise and a left to right flip, as pygame.transform.rotate and flip do them
+    pixels = np.rot90(pixels, turns)
+
+    return pixels[:, ::-1] if mirrored else pixels
+
 
+def variant_signatures(tileset, variants):
+    # only the untransformed tiles are read, every other variant is turned from the full-size pixels of its source
+    # and sampled where pygame.transform.scale samples, so it gets the signature a scan of its own image gives
+    sources = {source: image_pixels(tileset[source].image) for source in {source for source, _, _ in variants}}
 
-def pixel_diff(pxl1, pxl2):
-    return sum(map(lambda idx: abs(pxl1[idx] - pxl2[idx]) / (255 * 3), range(4)))
-    # return sum(map(lambda idx: abs(pxl1[idx] - pxl2[idx]) / 255, range(4)))
+    signatures = np.empty((len(variants), 4, 20, 4), dtype=np.uint8)
+    for i, (source, turns, mirrored) in enumerate(variants):
+        pixels = transform_pixels(sources[source], turns, mirrored)
+        rows, cols = scale_indices(pixels.shape[0]), scale_indices(pixels.shape[1])
+
+        signatures[i] = pixels[rows[0], cols], pixels[rows[-1], cols], pixels[rows, cols[0]], pixels[rows, cols[-1]]
+
+    return signatures
+
+
+def edge_strip(signatures, direction):
+    x, y = direction
+
+    if y:
+        side = signatures[:, TOP] if y < 0 else signatures[:, BOTTOM]
+        if x:
+            side = side[:, :1] if x < 0 else side[:, -1:]
+
+        return side
+
+    return signatures[:, LEFT_SIDE] if x < 0 else signatures[:, RIGHT_SIDE]
 
 
 class Index:
-    def __init__(self, tileset):
-        self.__rules = {}
-        for tile in tileset:
-            self.__rules[tile.idx] = {}
-            
-            for direction in DIRECTIONS:
-                self.__rules[tile.idx][direction] = []
-                
-                for neighbor in tileset:
-                    if self.__is_similar(tile, neighbor, direction):
-                        self.__rules[tile.idx][direction].append(neighbor.idx)
-    
-    def __is_similar(self, tile, neighbor, direction, k=0.1):
-        opposite_direction = -direction[0], -direction[1]
-        
-        tile_pixels = tile.edge_pixels(direction)
-        neighbor_pixels = neighbor.edge_pixels(opposite_direction)
-
-        lst = list(map(lambda idx: pixel_diff(tile_pixels[idx], neighbor_pixels[idx]), range(len(tile_pixels))))
-
-        return sum(lst) / len(lst) <= k
+    def __init__(self, tileset, k=0.1, variants=None):
+        if variants is None:
+            signatures = edge_signatures(tileset)
+        else:
+            signatures = variant_signatures(tileset, variants)
+
+        self.__signatures = signatures
+
+        signatures = signatures.astype(np.int32)
+        edges = {direction: edge_strip(signatures, direction) for direction in DIRECTIONS}
+
+        adjacency = np.zeros((len(DIRECTIONS), len(signatures), len(signatures)), dtype=bool)
+
+        for d, direction in enumerate(DIRECTIONS):
+            opposite_direction = -direction[0], -direction[1]
+
+            tile_pixels = edges[direction]
+            neighbor_pixels = edges[opposite_direction]
+
+            # mean over the edge of the per-pixel channel difference scaled by 255 * 3, kept in integers so
+            # the threshold test is exact: sum(diff) / (255 * 3 * len) <= k
+            diff = np.abs(tile_pixels[:, None] - neighbor_pixels[None, :]).sum(axis=(2, 3))
+            adjacency[d] = diff <= k * 255 * 3 * tile_pixels.shape[1]
+
+        self.__build(adjacency)
+
+    @classmethod
+    def from_adjacency(cls, adjacency, signatures=None, packed=None):
+        index = cls.__new__(cls)
+        index.__signatures = signatures
+        index.__build(adjacency, packed)
+
+        return index
+
+    def __build(self, adjacency, packed=None):
+        self.__adjacency = adjacency
+
+        # each adjacency row packed little-endian is the neighbor mask itself, bit i standing for tile i; a cached
+        # index passes the packed rows in, so the full adjacency is only read by code that asks for it
+        if packed is None:
+            packed = np.packbits(adjacency, axis=2, bitorder='little')
+        self.__packed = packed
+
+        # neighbor masks as Python ints, built per tile on first use
+        self.__masks = {}
+
+        # unions of neighbor masks keyed by (domain mask, direction), neighboring cells often share a domain
+        self.__allowed = OrderedDict()
+
+    def __tile_masks(self, idx):
+        masks = self.__masks.get(idx)
+        if masks is None:
+            masks = {direction: int.from_bytes(self.__packed[d, idx].tobytes(), 'little') for d, direction in enumerate(DIRECTIONS)}
+            self.__masks[idx] = masks
+
+        return masks
 
     def is_possible_neighbor(self, tile, neighbor, direction):
-        return neighbor.idx in self.__rules[tile.idx][direction]
+        return self.__tile_masks(tile.idx)[direction] & bit(neighbor.idx) != 0
+
+    def mask(self, idx, direction):
+        return self.__tile_masks(idx)[direction]
+
+    def allowed(self, mask, direction):
+        key = mask, direction
+
+        allowed = self.__allowed.get(key)
+        if allowed is not None:
+            self.__allowed.move_to_end(key)
+            return allowed
+
+        # with many tiles a domain holds hundreds of them, their masks are then ORed in NumPy rather than one by one
+        if len(self) > PACKED_TILES:
+            packed = self.__packed[DIRECTIONS.index(direction)]
+            tiles = np.unpackbits(np.frombuffer(mask.to_bytes(packed.shape[1], 'little'), dtype=np.uint8), bitorder='little')
+            allowed = int.from_bytes(np.bitwise_or.reduce(packed[np.flatnonzero(tiles)]).tobytes(), 'little')
+        else:
+            allowed = 0
+            for idx in bits(mask):
+                allowed |= self.__tile_masks(idx)[direction]
+
+        self.__allowed[key] = allowed
+        if len(self.__allowed) > MAX_ALLOWED:
+            self.__allowed.popitem(last=False)
+
+        return allowed
+
+    def violations(self, indices):
+        # (pos, direction) of every pair of neighbors the rules do not allow, cells left uncollapsed are skipped
+        height, width = len(indices), len(indices[0])
+
+        found = []
+        for y, row in enumerate(indices):
+            for x, idx in enumerate(row):
+                if idx < 0:
+                    continue
+
+                for direction in DIRECTIONS:
+                    nx, ny = x + direction[0], y + direction[1]
+                    if 0 <= nx < width and 0 <= ny < height and indices[ny][nx] >= 0 and self.mask(idx, direction) & bit(indices[ny][nx]) == 0:
+                        found.append(((x, y), direction))
+
+        return found
+
+    @property
+    def adjacency(self):
+        return self.__adjacency
+
+    @property
+    def packed(self):
+        return self.__packed
+
+    @property
+    def signatures(self):
+        return self.__signatures
+
+    def __len__(self):
+        return self.__packed.shape[1]
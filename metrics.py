@@ -0,0 +1,50 @@
+import time
+
+
+class Metrics:
+    COUNTERS = ('observations', 'propagations', 'removals', 'neighbor_checks', 'contradictions', 'backtracks')
+    TIMERS = ('min_entropy', 'propagate', 'observe')
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.reset()
+
+    def reset(self):
+        self.__counters = dict.fromkeys(self.COUNTERS, 0)
+        self.__timers = dict.fromkeys(self.TIMERS, 0.0)
+
+    def count(self, name, n=1):
+        self.__counters[name] += n
+
+    def record(self, phase, elapsed):
+        self.__timers[phase] += elapsed
+
+        if self.callback is not None:
+            self.callback(phase, elapsed, self)
+
+    def timed(self, phase, steps):
+        # only the time spent inside the generator is counted, not the time it is suspended between frames
+        elapsed = 0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    event = next(steps)
+                finally:
+                    elapsed += time.perf_counter() - start
+
+                yield event
+        except StopIteration:
+            pass
+        finally:
+            self.record(phase, elapsed)
+
+    def snapshot(self):
+        snapshot = dict(self.__counters)
+        for phase, elapsed in self.__timers.items():
+            snapshot[f'{phase}_time'] = elapsed
+
+        return snapshot
+
+    def __getitem__(self, key):
+        return self.snapshot()[key]
@@ -0,0 +1,181 @@
+import argparse
+import os
+import random
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import numpy as np
+import pygame
+
+from waveFunction import WaveFunction, Contradiction
+from generate import parse_size, save_indices, load_indices
+from ruleCache import load_tileset
+from renderConfig import RenderConfig
+
+
+def trivial_fill(tileset, size):
+    adjacency = np.asarray(tileset.index.adjacency)
+
+    # a tile allowed next to itself in every direction tiles the whole plane on its own
+    candidates = np.flatnonzero(np.diagonal(adjacency, axis1=1, axis2=2).all(axis=0))
+    if len(candidates) == 0:
+        raise ValueError('no tile can be its own neighbor in every direction, start from a previous solve instead')
+
+    tile = max(candidates, key=lambda idx: tileset.weights[idx])
+
+    width, height = size
+    return np.full((height, width), tile, dtype=np.int16)
+
+
+class ModifyInBlocks:
+    def __init__(self, tileset, render_cfg, size, initial=None, seed=0, overlap=None, attempts=10, **kwargs):
+        self.__window = render_cfg.output_size
+        self.__size = size
+        self.__rng = random.Random(seed)
+        self.__attempts = attempts
+
+        width, height = size
+        window_width, window_height = self.__window
+        if window_width > width or window_height > height:
+            raise ValueError(f'window {self.__window} does not fit in an output of {size}')
+
+        # consecutive windows share this many cells, so no seam between them stays fixed for a whole pass
+        if overlap is None:
+            overlap = window_width // 4, window_height // 4
+        self.__overlap = overlap
+
+        if initial is None:
+            initial = trivial_fill(tileset, size)
+
+        self.__grid = np.array(initial, dtype=np.int16)
+        if self.__grid.shape != (height, width):
+            raise ValueError(f'expected an initial output of {size}, got {self.__grid.shape[::-1]}')
+
+        # one solver sized to a window is renovated for every window, memory does not grow with the output
+        self.__wave_function = WaveFunction(tileset, render_cfg, **kwargs)
+
+        self.__modified = 0
+        self.__failures = 0
+
+    def __constrain(self, x0, y0):
+        width, height = self.__size
+
+        def kept(x, y):
+            gx, gy = x0 + x, y0 + y
+            if 0 <= gx < width and 0 <= gy < height:
+                return int(self.__grid[gy, gx])
+
+        self.__wave_function.constrain_border(kept)
+
+    def modify(self, x0, y0):
+        window_width, window_height = self.__window
+
+        for attempt in range(self.__attempts):
+            self.__wave_function.renovate(self.__rng.getrandbits(32))
+
+            try:
+                self.__constrain(x0, y0)
+                self.__wave_function.solve()
+            except Contradiction:
+                continue
+
+            self.__grid[y0:y0 + window_height, x0:x0 + window_width] = self.__wave_function.indices()
+            self.__modified += 1
+
+            return True
+
+        # the window keeps its old tiles, which still fit, so a contradiction only costs this window
+        self.__failures += 1
+
+        return False
+
+    def windows(self):
+        width, height = self.__size
+        window_width, window_height = self.__window
+
+        step_x = max(window_width - self.__overlap[0], 1)
+        step_y = max(window_height - self.__overlap[1], 1)
+
+        # a random offset per pass moves the window seams, the last row and column are clamped to the edge
+        offset_x = self.__rng.randrange(step_x)
+        offset_y = self.__rng.randrange(step_y)
+
+        xs = sorted({min(max(x, 0), width - window_width) for x in range(-offset_x, width, step_x)})
+        ys = sorted({min(max(y, 0), height - window_height) for y in range(-offset_y, height, step_y)})
+
+        windows = [(x, y) for y in ys for x in xs]
+        self.__rng.shuffle(windows)
+
+        return windows
+
+    def run(self, passes=1):
+        for _ in range(passes):
+            for x0, y0 in self.windows():
+                self.modify(x0, y0)
+
+    def indices(self):
+        return self.__grid.tolist()
+
+    @property
+    def grid(self):
+        return self.__grid
+
+    @property
+    def size(self):
+        return self.__size
+
+    @property
+    def window(self):
+        return self.__window
+
+    @property
+    def modified(self):
+        return self.__modified
+
+    @property
+    def failures(self):
+        return self.__failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate large outputs by re-solving small windows of a valid one')
+    parser.add_argument('tileset', help='tileset name from metadata.json')
+    parser.add_argument('--size', type=parse_size, default=(1000, 1000), help='output size as WIDTHxHEIGHT')
+    parser.add_argument('--window', type=parse_size, default=(16, 16), help='size of the re-solved windows as WIDTHxHEIGHT')
+    parser.add_argument('--passes', type=int, default=1, help='number of sweeps over the output')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--initial', metavar='FILE', help='start from an index map saved by an earlier run instead of a trivial fill')
+    parser.add_argument('--backtracks', type=int, default=100, help='backtrack budget per window')
+    parser.add_argument('--tile-size', type=int, default=8, help='pixels per tile in the saved PNG')
+    parser.add_argument('--out', default='output', help='directory for the PNG and index map')
+    args = parser.parse_args()
+
+    tilesheet_cfg, tileset = load_tileset(args.tileset)
+    render_cfg = RenderConfig(tilesheet_cfg, len(tileset), args.window)
+
+    initial = load_indices(args.initial) if args.initial is not None else None
+
+    modifier = ModifyInBlocks(tileset, render_cfg, args.size, initial, args.seed, max_backtracks=args.backtracks)
+
+    start = time.perf_counter()
+    for i in range(args.passes):
+        windows = modifier.windows()
+        for x0, y0 in windows:
+            modifier.modify(x0, y0)
+
+        print(f'pass {i}: {len(windows)} windows; {modifier.failures} failed so far; {time.perf_counter() - start:.3f}s')
+
+    cells = args.size[0] * args.size[1] * args.passes
+    elapsed = time.perf_counter() - start
+    print(f'{modifier.modified} windows re-solved; {modifier.failures} failed; {elapsed:.3f}s; {cells / elapsed:.0f} cells/s')
+
+    os.makedirs(args.out, exist_ok=True)
+    filename = os.path.join(args.out, f'{args.tileset}_{args.seed}_blocks')
+    indices = modifier.indices()
+    pygame.image.save(tileset.image(indices, (args.tile_size, args.tile_size)), f'{filename}.png')
+    save_indices(indices, f'{filename}.txt')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+import argparse
+import os
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import numpy as np
+import pygame
+
+from directions import DIRECTIONS
+from generate import parse_size, save_indices, solve_all
+from index import Index
+from renderConfig import RenderConfig
+from tile import Tile
+from tileset import Tileset
+
+
+def load_sample(filename):
+    image = pygame.image.load(filename)
+
+    # surfarray is indexed [x][y], samples keep the [row][col] layout
+    return pygame.surfarray.array3d(image).transpose(1, 0, 2)
+
+
+def row_keys(rows):
+    # every row viewed as one opaque value, so hashing and comparing it is a single operation
+    rows = np.ascontiguousarray(rows)
+    return rows.view(np.dtype((np.void, rows.dtype.itemsize * rows.shape[1])))[:, 0]
+
+
+def symmetries(windows, symmetry=8):
+    # the eight rotations and reflections, in the order the first `symmetry` of them are kept
+    variants = []
+    for turns in range(4):
+        rotated = np.rot90(windows, turns, axes=(1, 2))
+        variants += [rotated, rotated[:, :, ::-1]]
+
+    return np.concatenate(variants[:symmetry])
+
+
+def extract_patterns(sample_ids, n=3, wrap=True, symmetry=8):
+    if wrap:
+        sample_ids = np.pad(sample_ids, ((0, n - 1), (0, n - 1)), mode='wrap')
+
+    windows = np.lib.stride_tricks.sliding_window_view(sample_ids, (n, n)).reshape(-1, n, n)
+    windows = symmetries(windows, symmetry).reshape(-1, n * n)
+
+    # equal windows are found by hashing their bytes, how often each occurs becomes its weight
+    _, first, counts = np.unique(row_keys(windows), return_index=True, return_counts=True)
+
+    return windows[first].reshape(-1, n, n), counts
+
+
+def overlap_adjacency(patterns):
+    count, n = len(patterns), patterns.shape[1]
+    adjacency = np.zeros((len(DIRECTIONS), count, count), dtype=bool)
+
+    for d, (x, y) in enumerate(DIRECTIONS):
+        # the part of a pattern covered by a neighbor shifted by (x, y), and the part of the neighbor covering it
+        here = patterns[:, max(y, 0):n + min(y, 0), max(x, 0):n + min(x, 0)].reshape(count, -1)
+        there = patterns[:, max(-y, 0):n + min(-y, 0), max(-x, 0):n + min(-x, 0)].reshape(count, -1)
+
+        # both sides get ids from one hash table, so two patterns agree when their overlaps got the same id
+        _, ids = np.unique(row_keys(np.concatenate([here, there])), return_inverse=True)
+        adjacency[d] = ids[:count, None] == ids[None, count:]
+
+    return adjacency
+
+
+class OverlappingModel:
+    def __init__(self, sample, n=3, wrap=True, symmetry=8):
+        if n < 2:
+            raise ValueError(f'patterns need to be at least 2x2 to overlap, got {n}')
+
+        if not 1 <= symmetry <= 8:
+            raise ValueError(f'symmetry is the number of rotations and reflections kept, 1 to 8, got {symmetry}')
+
+        colors, sample_ids = np.unique(sample.reshape(-1, sample.shape[2]), axis=0, return_inverse=True)
+        sample_ids = sample_ids.reshape(sample.shape[:2]).astype(np.min_scalar_type(len(colors)))
+
+        self.__n = n
+        self.__colors = colors
+        self.__patterns, self.__weights = extract_patterns(sample_ids, n, wrap, symmetry)
+        self.__adjacency = overlap_adjacency(self.__patterns)
+
+    @classmethod
+    def from_file(cls, filename, n=3, wrap=True, symmetry=8):
+        return cls(load_sample(filename), n, wrap, symmetry)
+
+    def tileset(self):
+        # a cell shows the top left pixel of its pattern, the rest of it is what the neighbors show
+        images = []
+        for pattern in self.__patterns:
+            image = pygame.Surface((1, 1))
+            image.fill(self.__colors[pattern[0, 0]])
+            images.append(image)
+
+        return Tileset(Tile.from_images(images), Index.from_adjacency(self.__adjacency), self.__weights.tolist())
+
+    @property
+    def n(self):
+        return self.__n
+
+    @property
+    def colors(self):
+        return self.__colors
+
+    @property
+    def patterns(self):
+        return self.__patterns
+
+    @property
+    def weights(self):
+        return self.__weights
+
+    @property
+    def adjacency(self):
+        return self.__adjacency
+
+    def __len__(self):
+        return len(self.__patterns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate images from the NxN patterns of a sample bitmap')
+    parser.add_argument('sample', help='path of the sample image')
+    parser.add_argument('--n', type=int, default=3, help='pattern size')
+    parser.add_argument('--symmetry', type=int, default=8, help='rotations and reflections of each pattern to keep, 1 to 8')
+    parser.add_argument('--no-wrap', action='store_true', help='do not take patterns across the sample edges')
+    parser.add_argument('--size', type=parse_size, default=(48, 48), help='output size as WIDTHxHEIGHT')
+    parser.add_argument('--seeds', type=int, default=1, help='number of seeds to generate')
+    parser.add_argument('--first-seed', type=int, default=0)
+    parser.add_argument('--out', default='output', help='directory for the PNGs and index maps')
+    parser.add_argument('--backtracks', type=int, default=1000, help='backtrack budget per run')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    model = OverlappingModel.from_file(args.sample, args.n, not args.no_wrap, args.symmetry)
+    tileset = model.tileset()
+    print(f'{len(model)} patterns of {len(model.colors)} colors in {time.perf_counter() - start:.3f}s')
+
+    render_cfg = RenderConfig(None, len(tileset), args.size)
+    seeds = range(args.first_seed, args.first_seed + args.seeds)
+    name = os.path.splitext(os.path.basename(args.sample))[0]
+
+    os.makedirs(args.out, exist_ok=True)
+
+    for seed, indices, elapsed, contradictions, backtracks in solve_all(tileset, render_cfg, seeds, max_backtracks=args.backtracks):
+        status = ''
+        if indices is not None:
+            filename = os.path.join(args.out, f'{name}_{seed}')
+            pygame.image.save(tileset.image(indices, (1, 1)), f'{filename}.png')
+            save_indices(indices, f'{filename}.txt')
+        else:
+            status = '; failed'
+
+        print(f'seed {seed}: {elapsed:.3f}s; {contradictions} contradictions; {backtracks} backtracks{status}')
+
+
+if __name__ == '__main__':
+    main()
@@ -2,11 +2,11 @@ from math import ceil, sqrt
 
 
 class RenderConfig:
-    def __init__(self, tilesheet_config):
+    def __init__(self, tilesheet_config, tiles_count=None, output_size=(20, 20)):
         self.__screen_width = 800
         self.__screen_height = 600
 
-        self.__output_size = 20, 20
+        self.__output_size = output_size
         
         max_field_width = 550
         max_field_height = 550
@@ -14,7 +14,10 @@ class RenderConfig:
         self.__tile_gap = 0
         self.__block_gap = 1#min(max(70 // max(OUTPUT_SIZE), 1), 10)
 
-        self.__tiles_count_in_row = ceil(sqrt(tilesheet_config.tiles_count))
+        if tiles_count is None:
+            tiles_count = tilesheet_config.tiles_count
+
+        self.__tiles_count_in_row = ceil(sqrt(tiles_count))
 
         self.__tile_width = int(((max_field_width - self.__block_gap * (max(self.__output_size) - 1)) / max(self.__output_size) + self.__tile_gap) / self.__tiles_count_in_row - self.__tile_gap)
         self.__tile_height = int(((max_field_height - self.__block_gap * (max(self.__output_size) - 1)) / max(self.__output_size) + self.__tile_gap) / self.__tiles_count_in_row - self.__tile_gap)
@@ -36,6 +39,10 @@ class RenderConfig:
 
         self.__fps = 15
 
+        # solver work done per frame when the run is budgeted
+        self.__frame_budget = 0.008
+        self.__frame_steps = 10000
+
     @property
     def screen_width(self):
         return self.__screen_width
@@ -111,3 +118,11 @@ class RenderConfig:
     @property
     def fps(self):
         return self.__fps
+
+    @property
+    def frame_budget(self):
+        return self.__frame_budget
+
+    @property
+    def frame_steps(self):
+        return self.__frame_steps
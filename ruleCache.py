@@ -0,0 +1,158 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from index import Index
+from tile import Tile
+from tileset import Tileset
+from tilesheet import Tilesheet
+from tilesheetConfig import TilesheetConfig
+
+
+CACHE_DIR = 'smth/cache/rules'
+VERSION = 5
+
+
+def cache_key(tileset_name, k=0.1):
+    digest = hashlib.sha256(f'{VERSION}:{k!r}'.encode())
+
+    with open(f'smth/assets/{tileset_name}.png', 'rb') as sheet:
+        digest.update(sheet.read())
+
+    with open('smth/WFCvisualizer/metadata.json') as json_file:
+        entry = json.load(json_file)[tileset_name]
+    digest.update(json.dumps(entry, sort_keys=True).encode())
+
+    return digest.hexdigest()
+
+
+def load(key, cache_dir=CACHE_DIR):
+    path = os.path.join(cache_dir, key)
+    if not os.path.isdir(path):
+        return
+
+    # the index works from the packed rules, which are an eighth of the size; the full adjacency is mapped
+    # rather than read, and only the propagators that need it page it in
+    adjacency = np.load(os.path.join(path, 'adjacency.npy'), mmap_mode='r')
+    packed = np.load(os.path.join(path, 'packed.npy'))
+    edges = np.load(os.path.join(path, 'edges.npy'), mmap_mode='r')
+
+    weights = None
+    if os.path.exists(os.path.join(path, 'weights.npy')):
+        weights = np.load(os.path.join(path, 'weights.npy')).tolist()
+
+    return adjacency, packed, edges, weights
+
+
+def store(key, index, weights, cache_dir=CACHE_DIR):
+    path = os.path.join(cache_dir, key)
+    if os.path.isdir(path):
+        return
+
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # written next to its final place and renamed, so a reader never sees half a cache entry
+    partial = tempfile.mkdtemp(dir=cache_dir)
+    np.save(os.path.join(partial, 'adjacency.npy'), index.adjacency)
+    np.save(os.path.join(partial, 'packed.npy'), index.packed)
+    np.save(os.path.join(partial, 'edges.npy'), index.signatures)
+    if weights is not None:
+        np.save(os.path.join(partial, 'weights.npy'), np.array(weights, dtype=float))
+
+    try:
+        os.rename(partial, path)
+    except OSError:
+        shutil.rmtree(partial)
+
+
+def load_tileset(tileset_name, k=0.1, cache_dir=CACHE_DIR):
+    tilesheet_cfg = TilesheetConfig(tileset_name)
+    tilesheet = Tilesheet(tilesheet_cfg)
+    tiles = Tile.from_images(tilesheet.tile_images)
+
+    key = cache_key(tileset_name, k)
+
+    cached = load(key, cache_dir)
+    if cached is not None:
+        adjacency, packed, edges, weights = cached
+        return tilesheet_cfg, Tileset(tiles, Index.from_adjacency(adjacency, edges, packed), weights)
+
+    index = Index(tiles, k, tilesheet.variants)
+    store(key, index, tilesheet.weights, cache_dir)
+
+    return tilesheet_cfg, Tileset(tiles, index, tilesheet.weights)
+
+
+def compile_tileset(tileset_name, k=0.1, cache_dir=CACHE_DIR, force=False):
+    key = cache_key(tileset_name, k)
+    if force:
+        shutil.rmtree(os.path.join(cache_dir, key), ignore_errors=True)
+
+    hit = os.path.isdir(os.path.join(cache_dir, key))
+
+    start = time.perf_counter()
+    load_tileset(tileset_name, k, cache_dir)
+
+    return tileset_name, key, hit, time.perf_counter() - start
+
+
+def precompile(tileset_names, workers=None, k=0.1, cache_dir=CACHE_DIR, force=False):
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(compile_tileset, tileset_name, k, cache_dir, force) for tileset_name in tileset_names]
+
+        for future in futures:
+            yield future.result()
+
+
+def verify_variants(tileset_name, k=0.1):
+    # every rotation and reflection is made, so a sheet that uses none of them is still checked
+    tilesheet = Tilesheet(TilesheetConfig(tileset_name), rotation=True, symmetry=True)
+    tiles = Tile.from_images(tilesheet.tile_images)
+
+    derived = Index(tiles, k, tilesheet.variants).adjacency
+    scanned = Index(tiles, k).adjacency
+
+    return tileset_name, len(tiles), int((derived != scanned).sum())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompile the adjacency rules of tilesets into the on-disk cache')
+    parser.add_argument('tilesets', nargs='*', help='tileset names from metadata.json, all of them by default')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes, one per CPU by default')
+    parser.add_argument('--k', type=float, default=0.1, help='edge similarity threshold')
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--force', action='store_true', help='rebuild entries that are already cached')
+    parser.add_argument('--verify', action='store_true', help='check that rules derived for rotated and mirrored tiles equal rules scanned from their images')
+    args = parser.parse_args()
+
+    tileset_names = args.tilesets
+    if len(tileset_names) == 0:
+        with open('smth/WFCvisualizer/metadata.json') as json_file:
+            tileset_names = list(json.load(json_file))
+
+    if args.verify:
+        mismatched = 0
+        with ProcessPoolExecutor(args.workers) as executor:
+            for tileset_name, tiles_count, mismatches in executor.map(verify_variants, tileset_names, [args.k] * len(tileset_names)):
+                print(f'{tileset_name}: {tiles_count} variants; {mismatches} mismatched rules')
+                mismatched += mismatches
+
+        if mismatched:
+            raise SystemExit(f'{mismatched} derived rules differ from the scanned ones')
+
+        return
+
+    for tileset_name, key, hit, elapsed in precompile(tileset_names, args.workers, args.k, args.cache_dir, args.force):
+        status = 'cached' if hit else 'compiled'
+        print(f'{tileset_name}: {status} in {elapsed:.3f}s; {key[:12]}')
+
+
+if __name__ == '__main__':
+    main()
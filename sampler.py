@@ -0,0 +1,100 @@
+from collections import OrderedDict
+
+from bitmask import bits
+
+
+def weights_from_example(indices, tiles_count):
+    # every tile keeps a count of one so tiles missing from the example can still be placed
+    counts = [1] * tiles_count
+    for row in indices:
+        for idx in row:
+            if idx >= 0:
+                counts[idx] += 1
+
+    return counts
+
+
+class AliasTable:
+    def __init__(self, tiles, weights):
+        self.__tiles = tiles
+        self.__probs = [0.0] * len(tiles)
+        self.__aliases = list(range(len(tiles)))
+
+        total = sum(weights)
+        scaled = [weight * len(tiles) / total for weight in weights]
+
+        small = [i for i, prob in enumerate(scaled) if prob < 1]
+        large = [i for i, prob in enumerate(scaled) if prob >= 1]
+
+        while len(small) != 0 and len(large) != 0:
+            less, more = small.pop(), large.pop()
+
+            self.__probs[less] = scaled[less]
+            self.__aliases[less] = more
+
+            scaled[more] -= 1 - scaled[less]
+            if scaled[more] < 1:
+                small.append(more)
+            else:
+                large.append(more)
+
+        # whatever is left is 1 up to rounding
+        for i in small + large:
+            self.__probs[i] = 1.0
+
+    def sample(self, rng):
+        u = rng.random() * len(self.__tiles)
+        i = int(u)
+
+        if u - i < self.__probs[i]:
+            return self.__tiles[i]
+
+        return self.__tiles[self.__aliases[i]]
+
+    def __len__(self):
+        return len(self.__tiles)
+
+
+class Sampler:
+    def __init__(self, weights, max_tables=4096):
+        self.__weights = weights
+        self.__max_tables = max_tables
+
+        # alias tables keyed by domain mask, a table is only built the first time its domain is observed
+        self.__tables = OrderedDict()
+        self.__hits = 0
+        self.__misses = 0
+
+    def table(self, mask):
+        table = self.__tables.get(mask)
+
+        if table is not None:
+            self.__hits += 1
+            self.__tables.move_to_end(mask)
+            return table
+
+        self.__misses += 1
+
+        tiles = list(bits(mask))
+        table = AliasTable(tiles, [self.__weights[idx] for idx in tiles])
+
+        self.__tables[mask] = table
+        if len(self.__tables) > self.__max_tables:
+            self.__tables.popitem(last=False)
+
+        return table
+
+    def sample(self, mask, rng):
+        return self.table(mask).sample(rng)
+
+    @property
+    def weights(self):
+        return self.__weights
+
+    @property
+    def hits(self):
+        return self.__hits
+
+    @property
+    def misses(self):
+        return self.__misses
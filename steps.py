@@ -0,0 +1,14 @@
+REMOVAL = 'removal'
+CELL = 'cell'
+OBSERVATION = 'observation'
+PROPAGATION = 'propagation'
+
+GRANULARITIES = [REMOVAL, CELL, OBSERVATION, PROPAGATION]
+
+# the yields a step of each granularity stops at, a finer step also stops at every coarser event
+STOPS = {
+    REMOVAL: {REMOVAL, CELL, OBSERVATION, PROPAGATION},
+    CELL: {CELL, OBSERVATION, PROPAGATION},
+    OBSERVATION: {OBSERVATION},
+    PROPAGATION: {PROPAGATION}
+}
@@ -0,0 +1,164 @@
+from array import array
+from itertools import groupby
+from operator import itemgetter
+
+import numpy as np
+
+from bitmask import bit, bits
+
+from directions import DIRECTIONS
+
+
+# supports of the padding cells around the grid, they are never removed from so never reach zero
+PADDING_SUPPORT = 1 << 30
+
+# added to the supports of a tile once it is removed, so they cannot fall to zero and report it again
+REMOVED_SUPPORT = 1 << 20
+
+
+class SupportPropagator:
+    def __init__(self, index, size, domains, tiles_count, save):
+        self.__size = size
+        self.__domains = domains
+        self.__tiles_count = tiles_count
+        self.__save = save
+
+        # the grid is padded by one cell on every side, so a neighbor never needs a bounds check
+        width, height = size
+        self.__padded_width = width + 2
+
+        opposite = [DIRECTIONS.index((-dx, -dy)) for dx, dy in DIRECTIONS]
+
+        adjacency = np.asarray(index.adjacency)
+
+        # supports[cell * 8 + k, tile] counts the tiles left in the neighbor at DIRECTIONS[k] that still allow tile
+        # in cell; rules are symmetric, so on a full grid it is the size of the rule list
+        template = np.full((height + 2, self.__padded_width, len(DIRECTIONS), tiles_count), PADDING_SUPPORT, dtype=np.int32)
+        template[1:-1, 1:-1] = adjacency.sum(axis=2)
+        self.__template = template.reshape(-1, tiles_count)
+
+        # the supports a set of removed tiles takes from each of the eight neighbors, as one product; float32
+        # products are exact for any count a tileset can have
+        self.__losses = adjacency.transpose(1, 0, 2).reshape(tiles_count, -1).astype(np.float32)
+
+        # the row in each neighbor that points back at a cell, relative to the first row of the cell
+        self.__neighbor_rows = np.array([(dy * self.__padded_width + dx) * len(DIRECTIONS) + opposite[k] for k, (dx, dy) in enumerate(DIRECTIONS)], dtype=np.int64)
+
+        # a tile no neighbor allows in a direction that stays inside the grid starts with a support of zero, no
+        # decrement ever reports it, so like the first pass of AC-4 it is removed before anything else propagates
+        ys, xs = np.mgrid[:height, :width]
+        inside = np.stack([(xs + dx >= 0) & (xs + dx < width) & (ys + dy >= 0) & (ys + dy < height) for dx, dy in DIRECTIONS], axis=2)
+        unsupported = (inside[:, :, :, None] & (adjacency.sum(axis=2) == 0)).any(axis=2)
+
+        packed = np.packbits(unsupported, axis=2, bitorder='little')
+        self.__unsupported = [((y + 1) * self.__padded_width + x + 1, int.from_bytes(packed[y, x].tobytes(), 'little')) for y, x in zip(*np.nonzero(unsupported.any(axis=2)))]
+
+        self.reset()
+
+    def reset(self):
+        self.__known = list(self.__domains)
+        self.__supports = self.__template.copy()
+
+        # removals waiting to be applied, as padded cell * tiles_count + tile
+        self.__removals = []
+
+        # (padded cell, tiles) removed by the next propagation before any removal is applied
+        self.__pending = list(self.__unsupported)
+
+        # every removal whose decrements were applied, in the same form, so they can be undone
+        self.__applied = array('q')
+
+        self.contradiction = False
+
+    def __apply(self, removals, sign):
+        cells, tiles = np.divmod(removals, self.__tiles_count)
+        removed_cells, rows = np.unique(cells, return_inverse=True)
+
+        removed = np.zeros((len(removed_cells), self.__tiles_count), dtype=np.float32)
+        removed[rows, tiles] = 1
+
+        # two distinct cells never share a neighbor row, so all neighbors are updated by one assignment
+        neighbor_rows = (removed_cells[:, None] * len(DIRECTIONS) + self.__neighbor_rows).reshape(-1)
+        losses = (removed @ self.__losses).astype(np.int32).reshape(len(neighbor_rows), self.__tiles_count)
+        self.__supports[neighbor_rows] -= sign * losses
+
+        own_rows = cells[:, None] * len(DIRECTIONS) + np.arange(len(DIRECTIONS))
+        self.__supports[own_rows, tiles[:, None]] += sign * REMOVED_SUPPORT
+
+        return neighbor_rows, losses
+
+    def add(self, pos):
+        i = pos[1] * self.__size[0] + pos[0]
+
+        removed = self.__known[i] & ~self.__domains[i]
+        self.__known[i] = self.__domains[i]
+
+        padded = ((pos[1] + 1) * self.__padded_width + pos[0] + 1) * self.__tiles_count
+        for tile in bits(removed):
+            self.__removals.append(padded + tile)
+
+    def mark(self):
+        return len(self.__applied)
+
+    def rollback(self, mark, cells):
+        if len(self.__applied) > mark:
+            self.__apply(np.array(self.__applied[mark:], dtype=np.int64), -1)
+            del self.__applied[mark:]
+
+        for i in cells:
+            self.__known[i] = self.__domains[i]
+
+        self.__removals = []
+        self.contradiction = False
+
+    def propagate(self):
+        width = self.__size[0]
+        padded_width = self.__padded_width
+        tiles_count = self.__tiles_count
+        domains = self.__domains
+
+        groups, self.__pending = self.__pending, []
+
+        while not self.contradiction:
+            for cell, removed in groups:
+                y, x = divmod(cell, padded_width)
+                x, y = x - 1, y - 1
+                j = y * width + x
+
+                removed &= domains[j]
+                if removed == 0:
+                    continue
+
+                if removed == domains[j]:
+                    self.contradiction = True
+                    return
+
+                self.__save(j)
+                domains[j] &= ~removed
+                self.__known[j] &= ~removed
+                self.__removals += [cell * tiles_count + tile for tile in bits(removed)]
+
+                yield (x, y), removed
+
+            if len(self.__removals) == 0:
+                return
+
+            batch = np.array(self.__removals, dtype=np.int64)
+            self.__removals = []
+
+            # the decrements of a whole batch are applied and recorded together so a rollback reverses all of them
+            self.__applied.extend(batch.tolist())
+            neighbor_rows, losses = self.__apply(batch, 1)
+
+            # a support only falls to zero once and removed tiles never get there, so every zero is new; a tile can
+            # lose its last support in several directions at once, sorting them also groups the removals per cell
+            rows, tiles = np.nonzero((self.__supports[neighbor_rows] == 0) & (losses != 0))
+            cells, tiles = np.divmod(np.unique(neighbor_rows[rows] // len(DIRECTIONS) * tiles_count + tiles), tiles_count)
+
+            groups = []
+            for cell, group in groupby(zip(cells.tolist(), tiles.tolist()), key=itemgetter(0)):
+                removed = 0
+                for _, tile in group:
+                    removed |= bit(tile)
+
+                groups.append((cell, removed))
@@ -0,0 +1,100 @@
+from collections import OrderedDict
+
+import pygame
+
+from bitmask import bits
+
+from colors import BLACK, DARK_GREY
+
+
+class SurfaceCache:
+    def __init__(self, tiles, max_thumbnails=1024):
+        self.__tiles = tiles
+
+        self.__render_cfg = None
+        self.__layout = None
+
+        self.__scaled = {}
+        self.__shades = {}
+
+        # composed images of uncollapsed blocks keyed by domain mask, many cells share a domain early in a solve
+        self.__thumbnails = OrderedDict()
+        self.__max_thumbnails = max_thumbnails
+        self.__hits = 0
+        self.__misses = 0
+
+    def use(self, render_cfg):
+        if render_cfg is self.__render_cfg:
+            return
+
+        self.__render_cfg = render_cfg
+
+        layout = render_cfg.tile_width, render_cfg.tile_height, render_cfg.block_width, render_cfg.block_height
+        if layout != self.__layout:
+            self.__layout = layout
+            self.clear()
+
+    def clear(self):
+        self.__scaled = {}
+        self.__shades = {}
+        self.__thumbnails = OrderedDict()
+
+    def scaled(self, idx, size):
+        key = idx, size
+
+        surface = self.__scaled.get(key)
+        if surface is None:
+            surface = pygame.transform.scale(self.__tiles[idx].image, size)
+            self.__scaled[key] = surface
+
+        return surface
+
+    def shade(self, size):
+        surface = self.__shades.get(size)
+        if surface is None:
+            surface = pygame.Surface(size, pygame.SRCALPHA)
+            surface.fill((*BLACK, 128))
+            self.__shades[size] = surface
+
+        return surface
+
+    def thumbnail(self, mask):
+        thumbnail = self.__thumbnails.get(mask)
+
+        if thumbnail is not None:
+            self.__hits += 1
+            self.__thumbnails.move_to_end(mask)
+            return thumbnail
+
+        self.__misses += 1
+
+        render_cfg = self.__render_cfg
+        size = render_cfg.tile_width, render_cfg.tile_height
+
+        thumbnail = pygame.Surface((render_cfg.block_width, render_cfg.block_height))
+        thumbnail.fill(DARK_GREY)
+
+        for idx in bits(mask):
+            x = idx %  render_cfg.tiles_count_in_row * (render_cfg.tile_width + render_cfg.tile_gap)
+            y = idx // render_cfg.tiles_count_in_row * (render_cfg.tile_height + render_cfg.tile_gap)
+            thumbnail.blit(self.scaled(idx, size), (x, y))
+
+        self.__thumbnails[mask] = thumbnail
+        if len(self.__thumbnails) > self.__max_thumbnails:
+            self.__thumbnails.popitem(last=False)
+
+        return thumbnail
+
+    @property
+    def hits(self):
+        return self.__hits
+
+    @property
+    def misses(self):
+        return self.__misses
+
+    def stats(self):
+        return {'hits': self.__hits, 'misses': self.__misses, 'thumbnails': len(self.__thumbnails), 'scaled': len(self.__scaled)}
+
+    def __len__(self):
+        return len(self.__scaled)
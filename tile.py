@@ -1,64 +1,91 @@
+import numpy as np
 import pygame
 
 from IRenderable import IRenderable
 
-from directions import UP, DOWN, LEFT, RIGHT, UP_LEFT, UP_RIGHT, DOWN_LEFT, DOWN_RIGHT
-from colors import BLACK
+
+def image_pixels(image):
+    # surfarray is indexed [x][y], pixels keep the [row][col] layout of get_at scans
+    pixels = np.empty((image.get_height(), image.get_width(), 4), dtype=np.uint8)
+    pixels[:, :, :3] = pygame.surfarray.array3d(image).transpose(1, 0, 2)
+    pixels[:, :, 3] = pygame.surfarray.array_alpha(image).T
+
+    return pixels
+
+
+# source positions pygame.transform.scale samples, per (length, size)
+SCALE_INDICES = {}
+
+
+def scale_indices(length, size=20):
+    key = length, size
+    if key not in SCALE_INDICES:
+        # a strip whose pixels hold their own position, scaled, tells which position every sample was taken from
+        positions = np.arange(length)
+        strip = np.zeros((length, 1, 3), dtype=np.uint8)
+        strip[:, 0, 0] = positions & 255
+        strip[:, 0, 1] = positions >> 8
+
+        surface = pygame.Surface((length, 1))
+        pygame.surfarray.blit_array(surface, strip)
+        scaled = pygame.surfarray.array3d(pygame.transform.scale(surface, (size, 1)))[:, 0].astype(np.int64)
+
+        SCALE_INDICES[key] = scaled[:, 0] | scaled[:, 1] << 8
+
+    return SCALE_INDICES[key]
+
+
+class TilePixels:
+    __slots__ = ('__images', '__pixels')
+
+    def __init__(self, images):
+        self.__images = images
+
+        # pixels are only scanned when rules are built, a cached index never needs them
+        self.__pixels = None
+
+    def __getitem__(self, idx):
+        return self.pixels[idx]
+
+    @property
+    def pixels(self):
+        if self.__pixels is None:
+            pixels = np.empty((len(self.__images), 20, 20, 4), dtype=np.uint8)
+            for idx, image in enumerate(self.__images):
+                pixels[idx] = image_pixels(pygame.transform.scale(image, (20, 20)))
+
+            self.__pixels = pixels
+
+        return self.__pixels
 
 
 class Tile(IRenderable):
-    COUNT = 0
+    __slots__ = ('__image', '__idx', '__pixels')
 
-    def __init__(self, image, tilesheet_cfg):
+    def __init__(self, image, idx, pixels):
         self.__image = image
+        self.__idx = idx
 
-        image = pygame.transform.scale(image, (20, 20))
-        pixelset = []
-        for j in range(image.get_height()):
-            pixelset.append([])
-            for i in range(image.get_width()):
-                pixel = image.get_at((i, j))
-                pixelset[j].append(pixel)
-        
-        self.__pixelset = pixelset
-        self.__idx = Tile.COUNT % tilesheet_cfg.tiles_count
-
-        Tile.COUNT += 1
-    
-    def edge_pixels(self, direction):
-        if direction == UP:
-            return self.pixelset[0]
-        elif direction == DOWN:
-            return self.pixelset[-1]
-        elif direction == LEFT:
-            return list(map(lambda x: x[0], self.__pixelset))
-        elif direction == RIGHT:
-            return list(map(lambda x: x[-1], self.__pixelset))
-        elif direction == UP_LEFT:
-            return [self.pixelset[0][0]]
-        elif direction == UP_RIGHT:
-            return [self.pixelset[0][-1]]
-        elif direction == DOWN_LEFT:
-            return [self.pixelset[-1][0]]
-        elif direction == DOWN_RIGHT:
-            return [self.pixelset[-1][-1]]
+        # every tile of a tileset shares one pixel array
+        self.__pixels = pixels
+
+    @classmethod
+    def from_images(cls, images):
+        pixels = TilePixels(images)
+        return [cls(image, idx, pixels) for idx, image in enumerate(images)]
     
     def render(self, screen, *args, render_cfg=None, **kwargs):
         x, y, size = args
+        surfaces = kwargs['surfaces']
+
+        screen.blit(surfaces.scaled(self.__idx, size), (x, y))
 
-        image = pygame.transform.scale(self.__image, size)
-        
         if not kwargs['is_single']:
-            rect = image.get_rect(x=x, y=y)
+            rect = pygame.Rect((x, y), size)
 
             mouse_pos = pygame.mouse.get_pos()
             if rect.collidepoint(mouse_pos):
-                surf = pygame.Surface(size, pygame.SRCALPHA)
-                surf.fill((*BLACK, 128))
-                
-                image.blit(surf, (0, 0))
-        
-        screen.blit(image, (x, y))
+                screen.blit(surfaces.shade(size), (x, y))
     
     @property
     def image(self):
@@ -66,17 +93,17 @@ class Tile(IRenderable):
 
     @property
     def pixelset(self):
-        return self.__pixelset
+        return self.__pixels[self.__idx]
 
     @property
     def idx(self):
         return self.__idx
     
     def __eq__(self, other):
-        return self.pixelset == other.pixelset
+        return isinstance(other, Tile) and self.__idx == other.idx
     
     def __hash__(self):
-        return hash(tuple(map(lambda x: tuple(x), self.pixelset)))
+        return hash(self.__idx)
 
     def __repr__(self):
         return f'{self.idx}'
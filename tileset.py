@@ -0,0 +1,65 @@
+import pygame
+
+from index import Index
+from tile import Tile
+from surfaceCache import SurfaceCache
+
+
+class Tileset:
+    def __init__(self, tiles, index, weights=None):
+        self.__tiles = tiles
+        self.__index = index
+        self.weights = weights
+
+        # scaled copies of the tile images for the current layout
+        self.__surfaces = SurfaceCache(tiles) if tiles is not None else None
+
+    @classmethod
+    def from_images(cls, tile_images, weights=None, variants=None):
+        tiles = Tile.from_images(tile_images)
+        return cls(tiles, Index(tiles, variants=variants), weights)
+
+    def headless(self):
+        return Tileset(None, self.__index, self.weights)
+
+    def image(self, indices, tile_size):
+        width, height = tile_size
+        image = pygame.Surface((width * len(indices[0]), height * len(indices)))
+
+        for i, row in enumerate(indices):
+            for j, idx in enumerate(row):
+                image.blit(self.__surfaces.scaled(idx, tile_size), (width * j, height * i))
+
+        return image
+
+    @property
+    def tiles(self):
+        return self.__tiles
+
+    @property
+    def index(self):
+        return self.__index
+
+    @property
+    def surfaces(self):
+        return self.__surfaces
+
+    @property
+    def weights(self):
+        return self.__weights
+
+    @weights.setter
+    def weights(self, val):
+        if val is None:
+            val = [1] * len(self.__index)
+
+        if len(val) != len(self.__index):
+            raise ValueError(f'expected {len(self.__index)} weights, got {len(val)}')
+
+        self.__weights = list(val)
+
+    def __getitem__(self, idx):
+        return self.__tiles[idx]
+
+    def __len__(self):
+        return len(self.__index)
@@ -1,29 +1,72 @@
+import hashlib
+
 import pygame
 
 
 class Tilesheet:
-    def __init__(self, tilesheet_config):
+    def __init__(self, tilesheet_config, rotation=None, symmetry=None):
         self.__sheet = pygame.image.load(f'smth/assets/{tilesheet_config.tileset_name}.png')
-        
+
+        if rotation is None:
+            rotation = tilesheet_config.rotation
+        if symmetry is None:
+            symmetry = tilesheet_config.symmetry
+
+        turns = range(4) if rotation else range(1)
+        mirrors = (False, True) if symmetry else (False,)
+
+        weights = tilesheet_config.weights or [1] * tilesheet_config.tiles_count
+
         self.__tile_images = []
+        self.__weights = []
+
+        # (source tile, quarter turns, mirrored) for every image, the source being the untransformed tile
+        self.__variants = []
+        hashes = {}
+
         for i in range(tilesheet_config.tiles_count):
             x = i %  tilesheet_config.cols * (tilesheet_config.tile_width + tilesheet_config.gap)
             y = i // tilesheet_config.cols * (tilesheet_config.tile_width + tilesheet_config.gap)
 
             tile_image = self.__get_tile_image(x, y, tilesheet_config.tile_width, tilesheet_config.tile_height)
-            self.__tile_images.append(tile_image)
+            source = len(self.__tile_images)
 
-            if tilesheet_config.symmetry:
-                pass
+            for mirrored in mirrors:
+                for turn in turns:
+                    image = self.__transform(tile_image, turn, mirrored)
 
-            if tilesheet_config.rotation:
-                self.__tile_images.append(pygame.transform.rotate(tile_image, 90))
-                self.__tile_images.append(pygame.transform.rotate(tile_image, 180))
-                self.__tile_images.append(pygame.transform.rotate(tile_image, 270))
+                    # symmetric or repeated tiles give the same image more than once, only the first is kept
+                    # and it takes over the weight of the copies so tile frequencies do not change
+                    digest = hashlib.sha1(pygame.image.tobytes(image, 'RGBA')).digest()
+                    if digest in hashes:
+                        self.__weights[hashes[digest]] += weights[i]
+                        continue
+                    hashes[digest] = len(self.__tile_images)
+
+                    self.__tile_images.append(image)
+                    self.__variants.append((source, turn, mirrored))
+                    self.__weights.append(weights[i])
 
     def __get_tile_image(self, x, y, width, height):
         return self.__sheet.subsurface((x, y, width, height))
 
+    @staticmethod
+    def __transform(image, turns, mirrored):
+        if turns:
+            image = pygame.transform.rotate(image, 90 * turns)
+        if mirrored:
+            image = pygame.transform.flip(image, True, False)
+
+        return image
+
     @property
     def tile_images(self):
         return self.__tile_images
+
+    @property
+    def weights(self):
+        return self.__weights
+
+    @property
+    def variants(self):
+        return self.__variants
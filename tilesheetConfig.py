@@ -16,6 +16,10 @@ class TilesheetConfig:
                 self.__tiles_count = data['tiles_count']
                 self.__symmetry = data["symmetry"]
                 self.__rotation = data["rotation"]
+                self.__weights = data.get('weights')
+
+                if self.__weights is not None and (len(self.__weights) != self.__tiles_count or min(self.__weights) <= 0):
+                    raise SystemExit(f'Tileset {tileset_name} needs {self.__tiles_count} positive weights')
         
         except FileNotFoundError:
             raise SystemExit('File metadata.json does not exist')
@@ -58,3 +62,7 @@ class TilesheetConfig:
     @property
     def tiles_count(self):
         return self.__tiles_count
+
+    @property
+    def weights(self):
+        return self.__weights
@@ -33,6 +33,10 @@ class Toggle(IRenderable, IClickable):
 
                     return True
     
+    @property
+    def rect(self):
+        return self.__bottom_rect
+
     def render(self, screen, *args, **kwargs):
         pygame.draw.rect(screen, BLACK, self.__bottom_rect, border_radius=self.__bottom_rect.height // 2)
         
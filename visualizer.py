@@ -1,13 +1,14 @@
 import pygame
 
-from waveFunction import WaveFunction
+from waveFunction import WaveFunction, Contradiction
+from arrayWaveFunction import ArrayWaveFunction
 from button import Button
 from toggle import Toggle
-from tilesheet import Tilesheet
+from ruleCache import load_tileset
 from renderConfig import RenderConfig
-from tilesheetConfig import TilesheetConfig
 
 from colors import DARK_GREY
+from steps import GRANULARITIES
 
 import time
 
@@ -19,29 +20,37 @@ pygame.font.init()
 class Visualizer:
     def __init__(self):
         tileset_name = input('tileset name: ')
-        self.__tilesheet_cfg = TilesheetConfig(tileset_name)
-        self.__render_cfg = RenderConfig(self.__tilesheet_cfg)
+        self.__tilesheet_cfg, self.__tileset = load_tileset(tileset_name)
+        self.__render_cfg = RenderConfig(self.__tilesheet_cfg, len(self.__tileset))
 
         self.__screen = pygame.display.set_mode((self.__render_cfg.screen_width, self.__render_cfg.screen_height))
         pygame.display.set_caption('WFC visualizer')
         
         self.__clock = pygame.time.Clock()
 
-        tilesheet = Tilesheet(self.__tilesheet_cfg)
-        
-        self.__wave_function = WaveFunction(tilesheet.tile_images, self.__tilesheet_cfg, self.__render_cfg)
+        self.__wave_function = WaveFunction(self.__tileset, self.__render_cfg)
 
         self.__collapse_button = Button('Collapse', (595, 150), self.__render_cfg)
         self.__renovate_button = Button('Renovate', (595, 210), self.__render_cfg)
         self.__save_button = Button('Save', (595, 270), self.__render_cfg)
+        self.__granularity_button = Button(GRANULARITIES[0], (595, 390), self.__render_cfg)
 
         self.__propagation_toggle = Toggle((595, 330), self.__render_cfg)
         self.__update_toggle = Toggle((650, 330), self.__render_cfg)
+        self.__budget_toggle = Toggle((705, 330), self.__render_cfg)
 
         self.__to_propagate = True
         self.__to_update = True
         self.__start = False
 
+        # every frame runs steps of this granularity until the frame budget is spent, or a single step unbudgeted
+        self.__granularity = GRANULARITIES[0]
+        self.__to_budget = True
+
+        # the whole screen is only redrawn when it may have been lost, otherwise just the changed blocks
+        self.__redraw = True
+        self.__hovered = None
+
         self.__runner = True
 
     def get_col_row_idx(self, mouse_x, mouse_y):
@@ -75,42 +84,53 @@ class Visualizer:
                     
                     return self.__to_propagate
     
-    def image(self):
-        image = pygame.Surface((self.__tilesheet_cfg.tile_width * self.__render_cfg.output_size[0], self.__tilesheet_cfg.tile_height * self.__render_cfg.output_size[1]))
-
-        for i, row in enumerate(self.__wave_function.coeffs):
-            for j, block in enumerate(row):
-                image.blit(block.tiles[0].image, (self.__tilesheet_cfg.tile_width * j, self.__tilesheet_cfg.tile_height * i))
-
-        return image
-    
     def save_image(self, filename):
-        image = self.image()
+        image = self.__wave_function.image((self.__tilesheet_cfg.tile_width, self.__tilesheet_cfg.tile_height))
         pygame.image.save(image, f'{filename}.png')
     
     def process_input(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 self.__runner = False
+
+            elif event.type == pygame.WINDOWEXPOSED:
+                self.__redraw = True
             
             elif event.type == pygame.KEYDOWN:
                 if not self.__start:
                     if event.key == pygame.K_c:
+                        self.start_time = time.time()
                         self.__wave_function.collapse()
                         self.__start = True
                     
                     elif event.key == pygame.K_r:
-                        self.__wave_function.renovate(self.__tilesheet_cfg, self.__render_cfg)
+                        self.__wave_function.renovate()
                         self.__start = False
                     
                     elif event.key == pygame.K_p:
                         self.__to_propagate = not self.__to_propagate
+
+                    elif event.key == pygame.K_g:
+                        self.switch_granularity()
+
+                    elif event.key == pygame.K_b:
+                        self.__to_budget = not self.__to_budget
+
+                    elif event.key == pygame.K_e:
+                        engine = ArrayWaveFunction if isinstance(self.__wave_function, WaveFunction) else WaveFunction
+                        self.__wave_function = engine(self.__tileset, self.__render_cfg)
+                        self.__redraw = True
+                        print(f'Engine: {engine.__name__}')
                 
-                if event.key == pygame.K_n:
+                # a step needs a started run, before Collapse or after Renovate there is nothing to step through
+                if event.key == pygame.K_n and self.__start:
                     try:
-                        self.__wave_function.update()
+                        self.__wave_function.step(self.__granularity)
                     except StopIteration:
                         self.__start = False
+                    except Contradiction as error:
+                        print(f'Contradiction: {error}')
+                        self.__start = False
             
             if self.check_clicked_tile():
                 self.__wave_function.propagate()
@@ -122,7 +142,7 @@ class Visualizer:
                 self.__start = True
 
             elif self.__renovate_button.check_click():
-                self.__wave_function.renovate(self.__tilesheet_cfg, self.__render_cfg)
+                self.__wave_function.renovate()
                 self.__start = False
 
             elif self.__wave_function.is_collapsed() and self.__save_button.check_click():
@@ -134,27 +154,75 @@ class Visualizer:
             elif self.__update_toggle.check_click():
                 self.__to_update = not self.__to_update
 
+            elif self.__budget_toggle.check_click():
+                self.__to_budget = not self.__to_budget
+
+            elif self.__granularity_button.check_click():
+                self.switch_granularity()
+
+    def switch_granularity(self):
+        self.__granularity = GRANULARITIES[(GRANULARITIES.index(self.__granularity) + 1) % len(GRANULARITIES)]
+        self.__granularity_button.text = self.__granularity
+
     def update(self):
         if self.__start and self.__to_update:
+            deadline = time.perf_counter() + self.__render_cfg.frame_budget
+
             try:
-                self.__wave_function.update()
+                for _ in range(self.__render_cfg.frame_steps if self.__to_budget else 1):
+                    self.__wave_function.step(self.__granularity)
+
+                    if time.perf_counter() >= deadline:
+                        break
             except StopIteration:
                 print(f'Generation time: {self.__tilesheet_cfg.tileset_name}; {self.__render_cfg.output_size}; {time.time() - self.start_time}')
                 self.__start = False
+            except Contradiction as error:
+                print(f'Contradiction: {error}')
+                self.__start = False
+
+    def hovered_block(self):
+        col, row, _ = self.get_col_row_idx(*pygame.mouse.get_pos())
+        if col is not None:
+            return col, row
 
     def render(self):
-        self.__screen.fill(DARK_GREY)
-        
-        self.__wave_function.render(self.__screen, self.__render_cfg)
-        
-        self.__collapse_button.render(self.__screen)
-        self.__renovate_button.render(self.__screen)
-        self.__save_button.render(self.__screen)
+        widgets = [self.__collapse_button, self.__renovate_button, self.__save_button, self.__granularity_button, self.__propagation_toggle, self.__update_toggle, self.__budget_toggle]
 
-        self.__propagation_toggle.render(self.__screen)
-        self.__update_toggle.render(self.__screen)
-        
-        pygame.display.flip()
+        hovered = self.hovered_block()
+        changed = set(self.__wave_function.pop_changed())
+
+        if self.__redraw:
+            self.__screen.fill(DARK_GREY)
+            self.__wave_function.render(self.__screen, self.__render_cfg)
+
+            for widget in widgets:
+                widget.render(self.__screen)
+
+            pygame.display.flip()
+
+            self.__redraw = False
+            self.__hovered = hovered
+            return
+
+        # the hover shade follows the mouse, so the block under it and the one it left are redrawn as well
+        changed.update(pos for pos in (hovered, self.__hovered) if pos is not None)
+        self.__hovered = hovered
+
+        dirty_rects = []
+        for col, row in changed:
+            block = self.__wave_function.block_at_pos((col, row))
+
+            self.__screen.fill(DARK_GREY, block.rect)
+            block.render(self.__screen, self.__render_cfg)
+            dirty_rects.append(block.rect)
+
+        for widget in widgets:
+            self.__screen.fill(DARK_GREY, widget.rect)
+            widget.render(self.__screen)
+            dirty_rects.append(widget.rect)
+
+        pygame.display.update(dirty_rects)
 
     def run(self):
         while self.__runner:
@@ -1,187 +1,420 @@
+import heapq
 import math
 import random
+import time
+from array import array
 
-from index import Index
-from tile import Tile
-from block import Block
+from baseWaveFunction import BaseWaveFunction
+from sampler import Sampler
+from supportPropagator import SupportPropagator
 
-from IRenderable import IRenderable
+from bitmask import full_mask, bit, bits, bit_count
+from steps import REMOVAL, CELL, OBSERVATION, PROPAGATION
 
 from directions import *
 
 
-class WaveFunction(IRenderable):
-    def __init__(self, tile_images, tilesheet_cfg, render_cfg):
-        self.size = render_cfg.output_size
-        
-        self.__coeffs = []
-        for i in range(self.size[1]):
-            self.__coeffs.append([])
-            for j in range(self.size[0]):
-                # tileset = list(map(Tile, tile_images))
-                tileset = [Tile(img, tilesheet_cfg) for img in tile_images]
-
-                x = j * (render_cfg.block_width + render_cfg.block_gap)
-                y = i * (render_cfg.block_width + render_cfg.block_gap)
-                
-                block = Block(tileset, x, y, render_cfg)
-                self.__coeffs[i].append(block)
-        
-        # self.__tileset = list(map(Tile, tile_images))
-        self.__tileset = [Tile(img, tilesheet_cfg) for img in tile_images]
-        self.probabilities = {tile.idx: 1 / len(tileset) for tile in tileset}
-        self.index = Index(tileset)
+# the order neighbors are visited in, fixed so a seed always gives the same output
+NEIGHBOR_ORDER = [LEFT, RIGHT, DOWN, DOWN_LEFT, DOWN_RIGHT, UP, UP_LEFT, UP_RIGHT]
+
+
+class Contradiction(Exception):
+    pass
+
+
+class WaveFunction(BaseWaveFunction):
+    def __init__(self, tileset, render_cfg, use_supports=False, max_backtracks=1000, seed=None, metrics=None):
+        width, height = render_cfg.output_size
+        self.__domains = [full_mask(len(tileset))] * (width * height)
+
+        super().__init__(tileset, render_cfg, self.__domains)
+
+        self.__rng = random.Random(seed)
+
+        total = sum(tileset.weights)
+        self.probabilities = {idx: weight / total for idx, weight in enumerate(tileset.weights)}
+        self.__sampler = Sampler(self.probabilities)
+
         self.__stack = []
 
-        self.__collapse_gen = None
-    
-    def __entropy(self, pos):
-        block = self.block_at_pos(pos)
-        if len(block) == 1:
-            return 0
-        
-        return -sum([self.probabilities[tile.idx] * math.log(self.probabilities[tile.idx], 2) for tile in block]) - random.uniform(0, 0.1)
+        # running sums of w and w * log(w) over each domain, so a removal updates the entropy in O(1)
+        self.__weights = [self.probabilities[idx] for idx in range(len(tileset))]
+        self.__weight_logs = [weight * math.log2(weight) for weight in self.__weights]
+        self.__sums = array('d', [sum(self.__weights)]) * len(self.__domains)
+        self.__log_sums = array('d', [sum(self.__weight_logs)]) * len(self.__domains)
+        self.__entropies = array('d', [self.__shannon(self.__sums[0], self.__log_sums[0])]) * len(self.__domains)
+
+        # trail of (cell, domain, sum, log sum) saved before a cell first changes after a decision; stamps
+        # hold the level a cell was last saved at so every cell is saved once per level
+        self.__trail = []
+        self.__stamps = array('i', [0]) * len(self.__domains)
+        self.__level = 0
+        self.__decisions = []
+
+        # support counts only pay off when patterns have very few compatible neighbors, on the sample tilesets
+        # the mask propagator is faster, so they are an option of the solver and not of the command line tools
+        self.__supports = None
+        if use_supports:
+            self.__supports = SupportPropagator(self.index, self.size, self.__domains, len(tileset), self.__save)
+
+        self.__heap = []
+        self.__fill_heap()
+
+        self.max_backtracks = max_backtracks
+        self.__backtracks = 0
+        self.__contradictions = 0
+        self.__contradiction = False
+
+        # counters and timers are only touched when a Metrics object is attached
+        self.metrics = metrics
     
+    @staticmethod
+    def __shannon(weight_sum, log_sum):
+        return math.log2(weight_sum) - log_sum / weight_sum
+
+    def __remove_weight(self, i, idx):
+        self.__sums[i] -= self.__weights[idx]
+        self.__log_sums[i] -= self.__weight_logs[idx]
+        self.__entropies[i] = self.__shannon(self.__sums[i], self.__log_sums[i])
+
+    def __refresh_weights(self, i):
+        tiles = list(bits(self.__domains[i]))
+
+        self.__sums[i] = sum(self.__weights[idx] for idx in tiles)
+        self.__log_sums[i] = sum(self.__weight_logs[idx] for idx in tiles)
+        self.__entropies[i] = self.__shannon(self.__sums[i], self.__log_sums[i])
+
+    def __push_entropy(self, pos):
+        i = pos[1] * self.size[0] + pos[0]
+        mask = self.__domains[i]
+        if bit_count(mask) > 1:
+            heapq.heappush(self.__heap, (self.__entropies[i] - self.__rng.uniform(0, 0.1), i, mask))
+
+    def __fill_heap(self):
+        self.__heap = []
+        for i, mask in enumerate(self.__domains):
+            if bit_count(mask) > 1:
+                self.__heap.append((self.__entropies[i] - self.__rng.uniform(0, 0.1), i, mask))
+
+        heapq.heapify(self.__heap)
+
+    def entropy_at(self, pos):
+        col, row = pos
+        i = row * self.size[0] + col
+
+        return self.__entropies[i] if bit_count(self.__domains[i]) > 1 else 0
+
     def __min_entropy_pos(self):
-        min_entropy = None
-        pos = None
-
-        for y in range(self.size[1]):
-            for x in range(self.size[0]):
-                entropy = self.__entropy((x, y))
-                if entropy != 0 and (min_entropy is None or min_entropy > entropy):
-                    min_entropy = entropy
-                    pos = x, y
-        
-        return pos
+        while len(self.__heap) != 0:
+            _, i, mask = heapq.heappop(self.__heap)
+
+            # entries are never updated in place, a cell whose domain changed since the push is stale
+            if self.__domains[i] == mask and bit_count(mask) > 1:
+                return i % self.size[0], i // self.size[0]
     
     def __valid_directions(self, pos):
         x, y = pos
+        width, height = self.size
 
-        directions = []
-        if x == 0:
-            directions += [RIGHT]
-
-            if y == 0:
-                directions += [DOWN, DOWN_RIGHT]
-            elif y == self.size[1] - 1:
-                directions += [UP, UP_RIGHT]
-            else:
-                directions += [DOWN, DOWN_RIGHT, UP, UP_RIGHT]
-        elif x == self.size[0] - 1:
-            directions += [LEFT]
-
-            if y == 0:
-                directions += [DOWN, DOWN_LEFT]
-            elif y == self.size[1] - 1:
-                directions += [UP, UP_LEFT]
-            else:
-                directions += [DOWN, DOWN_LEFT, UP, UP_LEFT]
-        else:
-            directions += [LEFT, RIGHT]
+        if 0 < x < width - 1 and 0 < y < height - 1:
+            return NEIGHBOR_ORDER
 
-            if y == 0:
-                directions += [DOWN, DOWN_LEFT, DOWN_RIGHT]
-            elif y == self.size[1] - 1:
-                directions += [UP, UP_LEFT, UP_RIGHT]
-            else:
-                directions += [DOWN, DOWN_LEFT, DOWN_RIGHT, UP, UP_LEFT, UP_RIGHT]
-
-        return directions
+        return [direction for direction in NEIGHBOR_ORDER if 0 <= x + direction[0] < width and 0 <= y + direction[1] < height]
     
     def is_collapsed(self):
-        for row in self.__coeffs:
-            for block in row:
-                if len(block) > 1:
-                    return False
+        for mask in self.__domains:
+            if bit_count(mask) > 1:
+                return False
         
         return True
     
-    def block_at_pos(self, pos):
-        col, row = pos
-        return self.__coeffs[row][col]
-    
+    def __save(self, i):
+        if self.__stamps[i] != self.__level:
+            self.__stamps[i] = self.__level
+            self.__trail.append((i, self.__domains[i], self.__sums[i], self.__log_sums[i]))
+
+    def __undo(self, mark, supports_mark):
+        restored = []
+        while len(self.__trail) > mark:
+            i, mask, weight_sum, log_sum = self.__trail.pop()
+            self.__domains[i] = mask
+            self.__sums[i] = weight_sum
+            self.__log_sums[i] = log_sum
+            self.__entropies[i] = self.__shannon(weight_sum, log_sum)
+            restored.append(i)
+
+        if self._changed is not None:
+            self._changed.update(restored)
+
+        self.__stack = []
+        self.__contradiction = False
+
+        if self.__supports is not None:
+            self.__supports.rollback(supports_mark, restored)
+
+        for i in restored:
+            self.__push_entropy((i % self.size[0], i // self.size[0]))
+
+    def __backtrack(self):
+        while len(self.__decisions) != 0:
+            if self.__backtracks >= self.max_backtracks:
+                raise Contradiction(f'backtrack budget of {self.max_backtracks} exhausted')
+
+            self.__backtracks += 1
+            if self.metrics is not None:
+                self.metrics.count('backtracks')
+
+            mark, supports_mark, pos, idx = self.__decisions.pop()
+            self.__undo(mark, supports_mark)
+
+            # the choice made at the decision is banned, unless it was the only tile left there
+            i = pos[1] * self.size[0] + pos[0]
+            if bit_count(self.__domains[i]) > 1:
+                self.__level += 1
+                self.__save(i)
+                self.__domains[i] &= ~bit(idx)
+                self.__remove_weight(i, idx)
+                if self._changed is not None:
+                    self._changed.add(i)
+
+                self.__enqueue(pos)
+                self.__push_entropy(pos)
+
+                return
+
+        raise Contradiction('no decision left to backtrack to')
+
     def __observe(self):
+        metrics = self.metrics
+        if metrics is not None:
+            start = time.perf_counter()
+
         pos = self.__min_entropy_pos()
+
+        if metrics is not None:
+            metrics.record('min_entropy', time.perf_counter() - start)
+
         if pos is None:
             return
         
-        block = self.block_at_pos(pos)
-        block.set_random_tile(self.probabilities)
+        i = pos[1] * self.size[0] + pos[0]
+
+        self.__level += 1
+        mark = len(self.__trail)
+        supports_mark = self.__supports.mark() if self.__supports is not None else 0
+        self.__save(i)
+
+        idx = self.__sampler.sample(self.__domains[i], self.__rng)
+        self.__domains[i] = bit(idx)
+        self.__sums[i] = self.__weights[idx]
+        self.__log_sums[i] = self.__weight_logs[idx]
+        self.__entropies[i] = 0
+        if self._changed is not None:
+            self._changed.add(i)
+        self.__decisions.append((mark, supports_mark, pos, idx))
+
+        self.__enqueue(pos)
+
+        if metrics is not None:
+            metrics.count('observations')
+            metrics.record('observe', time.perf_counter() - start)
+
+        return pos
 
-        self.add_to_stack(pos)
-    
     def __propagate(self):
-        while len(self.__stack) != 0:
-            pos = self.__stack.pop()
-            block = self.block_at_pos(pos)
+        pops = checks = removals = 0
+
+        try:
+            if self.__supports is not None:
+                for pos, removed in self.__supports.propagate():
+                    i = pos[1] * self.size[0] + pos[0]
+                    if self._changed is not None:
+                        self._changed.add(i)
+                    pops += 1
+
+                    # the removals of a cell come together, the last one ends the cell step like on the stack path
+                    for idx in bits(removed):
+                        self.__remove_weight(i, idx)
+                        removals += 1
+
+                        if removed >> idx != 1:
+                            yield REMOVAL
+
+                    self.__push_entropy(pos)
+
+                    yield CELL
+
+                if self.__supports.contradiction:
+                    self.__contradictions += 1
+                    self.__contradiction = True
+
+                return
+
+            domains = self.__domains
+
+            while len(self.__stack) != 0:
+                pos = self.__stack.pop()
+                mask = self.mask_at_pos(pos)
+                pops += 1
+
+                for direction in self.__valid_directions(pos):
+                    adjacent_pos = pos[0] + direction[0], pos[1] + direction[1]
+                    j = adjacent_pos[1] * self.size[0] + adjacent_pos[0]
+
+                    allowed = self.index.allowed(mask, direction)
+                    checks += 1
+
+                    removed = domains[j] & ~allowed
+                    if removed == 0:
+                        continue
+
+                    if removed == domains[j]:
+                        self.__contradictions += 1
+                        self.__contradiction = True
+                        return
+
+                    self.__save(j)
+                    for idx in bits(removed):
+                        domains[j] &= ~bit(idx)
+                        self.__remove_weight(j, idx)
+                        if self._changed is not None:
+                            self._changed.add(j)
+                        removals += 1
+
+                        if domains[j] & removed != 0:
+                            yield REMOVAL
+                            continue
+
+                        self.__enqueue(adjacent_pos)
+                        self.__push_entropy(adjacent_pos)
+
+                        yield CELL
+        finally:
+            if self.metrics is not None:
+                self.metrics.count('propagations', pops)
+                self.metrics.count('neighbor_checks', checks)
+                self.metrics.count('removals', removals)
+                self.metrics.count('contradictions', int(self.__contradiction))
+
+    def constrain(self, pos, mask):
+        i = pos[1] * self.size[0] + pos[0]
+
+        if self.__domains[i] & mask == self.__domains[i]:
+            return
+
+        if self.__domains[i] & mask == 0:
+            raise Contradiction(f'no tile fits at {pos}')
+
+        self.__save(i)
+        self.__domains[i] &= mask
+        self.__refresh_weights(i)
+        if self._changed is not None:
+            self._changed.add(i)
 
-            for direction in self.__valid_directions(pos):
-                adjacent_pos = pos[0] + direction[0], pos[1] + direction[1]
-                adjacent_block = self.block_at_pos(adjacent_pos)
+        self.__enqueue(pos)
+        self.__push_entropy(pos)
 
-                is_changed = False
-                for neighbor in adjacent_block.tiles[:]:
-                    if len(adjacent_block) == 1:
-                        break
-                    
-                    if True not in [self.index.is_possible_neighbor(tile, neighbor, direction) for tile in block]:
-                        adjacent_block.tiles.remove(neighbor)
-                        is_changed = True
+    def constrain_border(self, lookup):
+        # lookup(x, y) gives the tile kept at a position outside the grid, or None where nothing is kept
+        width, height = self.size
 
-                        yield
+        # only the outermost ring of cells can touch a kept tile
+        border = {(x, y) for x in range(width) for y in (0, height - 1)} | {(x, y) for x in (0, width - 1) for y in range(height)}
+        for x, y in border:
+            mask = -1
+            for direction in DIRECTIONS:
+                nx, ny = x + direction[0], y + direction[1]
+                if 0 <= nx < width and 0 <= ny < height:
+                    continue
 
-                if is_changed:
-                    self.add_to_stack(adjacent_pos)
+                tile = lookup(nx, ny)
+                if tile is None:
+                    continue
+
+                # the cell sits in the opposite direction of the kept tile
+                mask &= self.index.allowed(bit(tile), (-direction[0], -direction[1]))
+
+            if mask != -1:
+                self.constrain((x, y), mask)
+
+    def __enqueue(self, pos):
+        if self.__supports is not None:
+            self.__supports.add(pos)
+        else:
+            self.__stack.append(pos)
 
     def add_to_stack(self, pos):
-        self.__stack.append(pos)
-    
-    def __collapse(self):
-        while not self.is_collapsed():
-            propagation_gen = self.__propagate()
-            propagation = True
-            
-            while propagation:
-                try:
-                    next(propagation_gen)
-                    yield
-                except StopIteration:
-                    propagation = False
-
-            self.__observe()
-            yield
-    
-    def propagate(self):
-        self.__collapse_gen = self.__propagate()
+        # the domain was changed from outside, e.g. by a click on a block
+        i = pos[1] * self.size[0] + pos[0]
+        self.__refresh_weights(i)
+        if self._changed is not None:
+            self._changed.add(i)
+        self.__enqueue(pos)
 
-    def collapse(self):
-        self.__collapse_gen = self.__collapse()
-    
-    def update(self):
-        next(self.__collapse_gen)
-    
-    def render(self, screen, render_cfg=None, *args, **kwargs):
-        for row in self.__coeffs:
-            for block in row:
-                block.render(screen, render_cfg)
+    def _resolve(self):
+        while True:
+            propagation = self.__propagate()
+            if self.metrics is not None:
+                propagation = self.metrics.timed('propagate', propagation)
+
+            yield from propagation
+
+            if not self.__contradiction:
+                yield PROPAGATION
+                return
+
+            self.__backtrack()
+            yield CELL
+
+    def _collapse(self):
+        while True:
+            yield from self._resolve()
+
+            if self.__observe() is None:
+                return
+
+            yield OBSERVATION
     
-    def renovate(self, tilesheet_cfg, render_cfg):
-        self.__collapse_gen = None
-        tile_images = list(map(lambda tile: tile.image, self.__tileset))
-        
-        self.__coeffs = []
-        for i in range(self.size[1]):
-            self.__coeffs.append([])
-            for j in range(self.size[0]):
-                tileset = [Tile(img, tilesheet_cfg) for img in tile_images]
-
-                x = j * (render_cfg.block_width + render_cfg.block_gap)
-                y = i * (render_cfg.block_height + render_cfg.block_gap)
-                
-                block = Block(tileset, x, y, render_cfg)
-                self.__coeffs[i].append(block)
+    def observe(self):
+        return self.__observe()
+
+    def indices(self):
+        width = self.size[0]
+        return [[mask.bit_length() - 1 if bit_count(mask) == 1 else -1 for mask in self.__domains[i:i + width]] for i in range(0, len(self.__domains), width)]
+
+    def renovate(self, seed=None):
+        if seed is not None:
+            self.__rng.seed(seed)
+
+        self._collapse_gen = None
+        self.__backtracks = 0
+        self.__contradictions = 0
+        self.__contradiction = False
+        self.__domains[:] = [full_mask(len(self._tileset))] * len(self.__domains)
+        self.__sums = array('d', [sum(self.__weights)]) * len(self.__domains)
+        self.__log_sums = array('d', [sum(self.__weight_logs)]) * len(self.__domains)
+        self.__entropies = array('d', [self.__shannon(self.__sums[0], self.__log_sums[0])]) * len(self.__domains)
+        self._changed = None
+
+        self.__trail = []
+        self.__stamps = array('i', [0]) * len(self.__domains)
+        self.__level = 0
+        self.__decisions = []
+
+        self.__stack = []
+        self.__fill_heap()
+
+        if self.__supports is not None:
+            self.__supports.reset()
+
+    @property
+    def sampler(self):
+        return self.__sampler
+
+    @property
+    def contradictions(self):
+        return self.__contradictions
 
     @property
-    def coeffs(self):
-        return self.__coeffs
+    def backtracks(self):
+        return self.__backtracks
@@ -0,0 +1,127 @@
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+from waveFunction import WaveFunction, Contradiction
+
+from directions import DIRECTIONS
+
+
+def chunk_seed(seed, cx, cy):
+    return (seed * 73856093 ^ cx * 19349663 ^ cy * 83492791) & 0xffffffff
+
+
+class World:
+    def __init__(self, tileset, render_cfg, seed=0, max_bytes=64 * 2 ** 20, spill_dir=None, attempts=10, **kwargs):
+        self.__chunk_size = render_cfg.output_size
+        self.__seed = seed
+
+        self.__max_bytes = max_bytes
+        self.__spill_dir = spill_dir
+        self.__attempts = attempts
+
+        # one solver sized to a chunk is renovated for every chunk instead of being rebuilt
+        self.__wave_function = WaveFunction(tileset, render_cfg, **kwargs)
+
+        self.__chunks = OrderedDict()
+        self.__bytes = 0
+
+        if spill_dir is not None:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def __spill_path(self, cx, cy):
+        return os.path.join(self.__spill_dir, f'{cx}_{cy}.npy')
+
+    def __store(self, key, chunk):
+        self.__chunks[key] = chunk
+        self.__bytes += chunk.nbytes
+
+        while self.__bytes > self.__max_bytes and len(self.__chunks) > 1:
+            (cx, cy), evicted = self.__chunks.popitem(last=False)
+            self.__bytes -= evicted.nbytes
+
+            # without a spill directory an evicted chunk is regenerated on the next request
+            # and may come out different if its neighbours changed in the meantime
+            if self.__spill_dir is not None:
+                np.save(self.__spill_path(cx, cy), evicted)
+
+    def __lookup(self, cx, cy):
+        key = cx, cy
+        if key in self.__chunks:
+            self.__chunks.move_to_end(key)
+            return self.__chunks[key]
+
+        if self.__spill_dir is not None and os.path.exists(self.__spill_path(cx, cy)):
+            chunk = np.load(self.__spill_path(cx, cy))
+            self.__store(key, chunk)
+            return chunk
+
+    def __constrain(self, cx, cy):
+        width, height = self.__chunk_size
+
+        neighbors = {}
+        for dx, dy in DIRECTIONS:
+            neighbors[dx, dy] = self.__lookup(cx + dx, cy + dy)
+
+        def kept(x, y):
+            chunk = neighbors.get((x // width, y // height))
+            if chunk is not None:
+                return int(chunk[y % height][x % width])
+
+        self.__wave_function.constrain_border(kept)
+
+    def __generate(self, cx, cy):
+        seed = chunk_seed(self.__seed, cx, cy)
+
+        for attempt in range(self.__attempts):
+            self.__wave_function.renovate(seed + attempt)
+
+            try:
+                self.__constrain(cx, cy)
+                self.__wave_function.solve()
+            except Contradiction:
+                continue
+
+            return np.array(self.__wave_function.indices(), dtype=np.int16)
+
+        raise Contradiction(f'chunk {(cx, cy)} does not fit its neighbours after {self.__attempts} attempts')
+
+    def chunk(self, cx, cy):
+        chunk = self.__lookup(cx, cy)
+
+        if chunk is None:
+            chunk = self.__generate(cx, cy)
+            self.__store((cx, cy), chunk)
+
+        return chunk
+
+    def get(self, x, y):
+        width, height = self.__chunk_size
+        return int(self.chunk(x // width, y // height)[y % height][x % width])
+
+    def area(self, x, y, width, height):
+        chunk_width, chunk_height = self.__chunk_size
+
+        area = np.empty((height, width), dtype=np.int16)
+        for cy in range(y // chunk_height, (y + height - 1) // chunk_height + 1):
+            for cx in range(x // chunk_width, (x + width - 1) // chunk_width + 1):
+                chunk = self.chunk(cx, cy)
+
+                left, top = max(x, cx * chunk_width), max(y, cy * chunk_height)
+                right, bottom = min(x + width, (cx + 1) * chunk_width), min(y + height, (cy + 1) * chunk_height)
+
+                area[top - y:bottom - y, left - x:right - x] = chunk[top - cy * chunk_height:bottom - cy * chunk_height, left - cx * chunk_width:right - cx * chunk_width]
+
+        return area
+
+    @property
+    def chunk_size(self):
+        return self.__chunk_size
+
+    @property
+    def cached_bytes(self):
+        return self.__bytes
+
+    def __len__(self):
+        return len(self.__chunks)